@@ -304,4 +304,13 @@ def check_settings(app_configs, **kwargs):
                 id="debug_toolbar.W008",
             )
         )
+    sample_rate = USER_CONFIG.get("SQL_QUERY_SAMPLE_RATE", 0)
+    if not 0 <= sample_rate <= 1:
+        errors.append(
+            Warning(
+                f"SQL_QUERY_SAMPLE_RATE is {sample_rate!r}, outside of the 0 to 1 range.",
+                hint="The SQL panel clamps the sample rate to that range.",
+                id="debug_toolbar.W009",
+            )
+        )
     return errors
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from debug_toolbar.store import DatabaseStore
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete the debug toolbar history entries stored by DatabaseStore "
+        "beyond RESULTS_CACHE_SIZE."
+    )
+
+    def handle(self, *args, **options):
+        deleted = DatabaseStore._cleanup_old_entries()
+        self.stdout.write(f"Deleted {deleted} history entries.")
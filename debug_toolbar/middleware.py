@@ -134,7 +134,7 @@ class DebugToolbarMiddleware:
 
         if not show_toolbar(request) or DebugToolbar.is_toolbar_request(request):
             return self.get_response(request)
-        toolbar = DebugToolbar(request, self.get_response)
+        toolbar = DebugToolbar(request, self.get_response, buffer_stats=True)
         # Activate instrumentation ie. monkey-patch.
         for panel in toolbar.enabled_panels:
             panel.enable_instrumentation()
@@ -158,7 +158,7 @@ class DebugToolbarMiddleware:
             response = await self.get_response(request)
             return response
 
-        toolbar = DebugToolbar(request, self.get_response)
+        toolbar = DebugToolbar(request, self.get_response, buffer_stats=True)
 
         # Activate instrumentation ie. monkey-patch.
         for panel in toolbar.enabled_panels:
@@ -189,6 +189,9 @@ class DebugToolbarMiddleware:
         for panel in reversed(toolbar.enabled_panels):
             panel.generate_stats(request, response)
             panel.generate_server_timing(request, response)
+        # Write every panel's stats to the store at once rather than on each
+        # call to record_stats.
+        toolbar.flush_stats()
 
         # Always render the toolbar for the history panel, even if it is not
         # included in the response.
@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("debug_toolbar", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="historyentry",
+            name="created_at",
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
@@ -5,7 +5,7 @@ from django.utils.translation import gettext_lazy as _
 class HistoryEntry(models.Model):
     request_id = models.UUIDField(primary_key=True)
     data = models.JSONField(default=dict)
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
 
     class Meta:
         verbose_name = _("history entry")
@@ -185,16 +185,15 @@ class Panel:
         """
         Store data gathered by the panel. ``stats`` is a :class:`dict`.
 
-        Each call to ``record_stats`` updates the store's data for
-        the panel.
-
-        To support backwards compatibility, it will also update the
-        panel's statistics dictionary.
+        Each call to ``record_stats`` updates the panel's statistics
+        dictionary and the store's data for the panel. When the toolbar
+        buffers its stats, as it does when run by the middleware, the store
+        is written once for all panels after the stats have been generated.
         """
         self.toolbar.stats.setdefault(self.panel_id, {}).update(stats)
-        self.toolbar.store.save_panel(
-            self.toolbar.request_id, self.panel_id, self.toolbar.stats[self.panel_id]
-        )
+        self.toolbar.save_stats(self.panel_id)
+        # Panels may cache their content, which the new stats invalidate.
+        self.__dict__.pop("content", None)
 
     def get_stats(self):
         """
@@ -4,10 +4,11 @@ from time import perf_counter
 from asgiref.local import Local
 from django.conf import settings
 from django.core.cache import CacheHandler, caches
+from django.template.loader import render_to_string
 from django.utils.translation import gettext_lazy as _, ngettext
 
 from debug_toolbar.panels import Panel
-from debug_toolbar.utils import get_stack_trace, get_template_info, render_stacktrace
+from debug_toolbar.utils import FrameTable, get_stack_trace, get_template_info
 
 # The order of the methods in this list determines the order in which they are listed in
 # the Commands table in the panel content.
@@ -135,7 +136,7 @@ class CachePanel(Panel):
                 "name": name,
                 "args": args,
                 "kwargs": kwargs,
-                "trace": render_stacktrace(trace),
+                "trace": self.toolbar.frame_table.add(trace),
                 "template_info": template_info,
                 "backend": backend,
             }
@@ -222,18 +223,34 @@ class CachePanel(Panel):
                 yield caches[alias], alias
 
     def generate_stats(self, request, response):
+        frames, traces = self.toolbar.frame_table.extract(
+            call["trace"] for call in self.calls
+        )
         self.record_stats(
             {
                 "total_calls": len(self.calls),
-                "calls": self.calls,
+                "calls": [
+                    {**call, "trace": trace} for call, trace in zip(self.calls, traces)
+                ],
                 "total_time": self.total_time,
                 "hits": self.hits,
                 "misses": self.misses,
                 "counts": self.counts,
                 "total_caches": len(getattr(settings, "CACHES", ["default"])),
+                "frames": frames,
             }
         )
 
+    @property
+    def content(self):
+        stats = self.get_stats()
+        frame_table = FrameTable(stats.get("frames", []))
+        calls = [
+            {**call, "trace": frame_table.render(call["trace"])}
+            for call in stats.get("calls", [])
+        ]
+        return render_to_string(self.template, {**stats, "calls": calls})
+
     def generate_server_timing(self, request, response):
         stats = self.get_stats()
         value = stats.get("total_time", 0)
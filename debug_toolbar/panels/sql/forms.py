@@ -1,25 +1,110 @@
 import json
+from collections import defaultdict
 
 from django import forms
 from django.core.exceptions import ValidationError
-from django.db import connections
+from django.db import DatabaseError, connections
 from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
 
-from debug_toolbar.panels.sql.utils import reformat_sql
+from debug_toolbar.panels.sql.utils import parse_plan, reformat_sql
+from debug_toolbar.store import get_store
 from debug_toolbar.toolbar import DebugToolbar
 
 
+def explain_query(cursor, query):
+    """
+    Run EXPLAIN for a recorded query with the given cursor and return the
+    resulting rows and column names.
+    """
+    sql = query["raw_sql"]
+    params = json.loads(query["params"])
+    vendor = query["vendor"]
+    if vendor == "sqlite":
+        # SQLite's EXPLAIN dumps the low-level opcodes generated for a query;
+        # EXPLAIN QUERY PLAN dumps a more human-readable summary
+        # See https://www.sqlite.org/lang_explain.html for details
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+    elif vendor == "postgresql":
+        cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}", params)
+    else:
+        cursor.execute(f"EXPLAIN {sql}", params)
+    headers = [d[0] for d in cursor.description]
+    result = cursor.fetchall()
+    return result, headers
+
+
+def explain_slow_queries(queries):
+    """
+    Run EXPLAIN once for each group of similar slow SELECT queries.
+
+    The slowest query of each group is explained, using a single cursor per
+    database alias, and the plan is stored in the ``explain`` key of every
+    query of the group. Returns the explained queries.
+    """
+    slowest = {}
+    for query in queries:
+        # EXPLAIN ANALYZE runs the query, so leave writes alone. The queries
+        # stored by older versions don't have a fingerprint to group them.
+        if (
+            not query.get("is_slow")
+            or not query.get("fingerprint")
+            or not query["params"]
+            or not query["raw_sql"].lstrip(" (").upper().startswith("SELECT")
+        ):
+            continue
+        key = (query["alias"], query["fingerprint"])
+        if key not in slowest or query["duration"] > slowest[key]["duration"]:
+            slowest[key] = query
+
+    queries_by_alias = defaultdict(list)
+    for query in slowest.values():
+        queries_by_alias[query["alias"]].append(query)
+
+    plans = {}
+    for alias, alias_queries in queries_by_alias.items():
+        with connections[alias].cursor() as cursor:
+            for query in alias_queries:
+                try:
+                    result, headers = explain_query(cursor, query)
+                except DatabaseError as exc:
+                    plan = {"error": str(exc)}
+                else:
+                    plan = {
+                        "result": result,
+                        "headers": headers,
+                        "nodes": parse_plan(query["vendor"], result),
+                    }
+                plans[(alias, query["fingerprint"])] = plan
+
+    for query in queries:
+        plan = plans.get((query["alias"], query.get("fingerprint")))
+        if plan is not None:
+            query["explain"] = plan
+    return list(slowest.values())
+
+
+def _fetch_sql_panel(request_id):
+    from debug_toolbar.panels.sql import SQLPanel
+
+    toolbar = DebugToolbar.fetch(request_id, panel_id=SQLPanel.panel_id)
+    if toolbar is None:
+        raise ValidationError(_("Data for this panel isn't available anymore."))
+    return toolbar.get_panel_by_id(SQLPanel.panel_id)
+
+
 class SQLSelectForm(forms.Form):
     """
     Validate params
 
         request_id: The identifier for the request
         query_id: The identifier for the query
+        query_index: The position of the query in the panel's queries
     """
 
     request_id = forms.CharField()
     djdt_query_id = forms.CharField()
+    query_index = forms.IntegerField(required=False, min_value=0)
 
     def clean_params(self):
         value = self.cleaned_data["params"]
@@ -41,21 +126,23 @@ class SQLSelectForm(forms.Form):
         from debug_toolbar.panels.sql import SQLPanel
 
         cleaned_data = super().clean()
-        toolbar = DebugToolbar.fetch(
-            self.cleaned_data["request_id"], panel_id=SQLPanel.panel_id
-        )
-        if toolbar is None:
-            raise ValidationError(_("Data for this panel isn't available anymore."))
-
-        panel = toolbar.get_panel_by_id(SQLPanel.panel_id)
-        # Find the query for this form submission
+        request_id = self.cleaned_data["request_id"]
+        djdt_query_id = self.cleaned_data["djdt_query_id"]
+        query_index = self.cleaned_data.get("query_index")
         query = None
-        for q in panel.get_stats()["queries"]:
-            if q["djdt_query_id"] != self.cleaned_data["djdt_query_id"]:
-                continue
-            else:
-                query = q
-                break
+        if query_index is not None:
+            # Only load the chunk of queries that contains this one.
+            records = get_store().panel(
+                request_id, SQLPanel.get_query_chunk_key(query_index)
+            )
+            query = records.get(djdt_query_id)
+        if query is None:
+            # Requests stored without the chunks of queries need a full scan.
+            panel = _fetch_sql_panel(request_id)
+            for q in panel.get_stats()["queries"]:
+                if q["djdt_query_id"] == djdt_query_id:
+                    query = q
+                    break
         if not query:
             raise ValidationError(_("Invalid query id."))
         cleaned_data["query"] = query
@@ -72,23 +159,8 @@ class SQLSelectForm(forms.Form):
             return result, headers
 
     def explain(self):
-        query = self.cleaned_data["query"]
-        sql = query["raw_sql"]
-        params = json.loads(query["params"])
-        vendor = query["vendor"]
         with self.cursor as cursor:
-            if vendor == "sqlite":
-                # SQLite's EXPLAIN dumps the low-level opcodes generated for a query;
-                # EXPLAIN QUERY PLAN dumps a more human-readable summary
-                # See https://www.sqlite.org/lang_explain.html for details
-                cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
-            elif vendor == "postgresql":
-                cursor.execute(f"EXPLAIN ANALYZE {sql}", params)
-            else:
-                cursor.execute(f"EXPLAIN {sql}", params)
-            headers = [d[0] for d in cursor.description]
-            result = cursor.fetchall()
-            return result, headers
+            return explain_query(cursor, self.cleaned_data["query"])
 
     def profile(self):
         query = self.cleaned_data["query"]
@@ -126,3 +198,72 @@ class SQLSelectForm(forms.Form):
     @cached_property
     def cursor(self):
         return self.connection.cursor()
+
+
+class SQLExplainSlowQueriesForm(forms.Form):
+    """
+    Validate params
+
+        request_id: The identifier for the request
+    """
+
+    request_id = forms.CharField()
+
+    def clean(self):
+        cleaned_data = super().clean()
+        cleaned_data["panel"] = _fetch_sql_panel(self.cleaned_data["request_id"])
+        return cleaned_data
+
+    def explain(self):
+        """
+        Explain the request's slow queries and store the plans with them.
+        """
+        panel = self.cleaned_data["panel"]
+        queries = panel.get_stats()["queries"]
+        explained = explain_slow_queries(queries)
+        if explained:
+            panel.record_stats({"queries": queries})
+        return explained
+
+
+class SQLQueriesFilterForm(forms.Form):
+    """
+    Validate params
+
+        request_id: The identifier for the request
+        page: The page of queries to render
+        alias, min_duration, fingerprint, in_trans: Filters for the queries
+    """
+
+    request_id = forms.CharField()
+    page = forms.IntegerField(required=False, min_value=1)
+    alias = forms.ChoiceField(label=_("Database"), required=False)
+    min_duration = forms.FloatField(
+        label=_("Minimum time (ms)"), required=False, min_value=0
+    )
+    fingerprint = forms.CharField(required=False)
+    in_trans = forms.BooleanField(label=_("In transaction"), required=False)
+
+    def __init__(self, *args, aliases=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["alias"].choices = [
+            ("", _("All")),
+            *((alias, alias) for alias in aliases),
+        ]
+
+    def filter(self, queries):
+        """
+        Return the (index, query) pairs of the queries matching the filters.
+        """
+        alias = self.cleaned_data["alias"]
+        min_duration = self.cleaned_data["min_duration"]
+        fingerprint = self.cleaned_data["fingerprint"]
+        in_trans = self.cleaned_data["in_trans"]
+        return [
+            (index, query)
+            for index, query in enumerate(queries)
+            if (not alias or query["alias"] == alias)
+            and (min_duration is None or query["duration"] >= min_duration)
+            and (not fingerprint or query.get("fingerprint") == fingerprint)
+            and (not in_trans or query.get("in_trans"))
+        ]
@@ -1,9 +1,16 @@
+import heapq
+import math
+import os
 import uuid
 from collections import defaultdict
 
+import django
 from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.core.paginator import Paginator
 from django.db import connections
 from django.template.loader import render_to_string
+from django.templatetags.static import static
 from django.urls import path
 from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _, ngettext
@@ -12,13 +19,23 @@ from debug_toolbar import settings as dt_settings
 from debug_toolbar.forms import SignedDataForm
 from debug_toolbar.panels import Panel
 from debug_toolbar.panels.sql import views
-from debug_toolbar.panels.sql.forms import SQLSelectForm
-from debug_toolbar.panels.sql.tracking import wrap_cursor
+from debug_toolbar.panels.sql.forms import (
+    SQLExplainSlowQueriesForm,
+    SQLQueriesFilterForm,
+    SQLSelectForm,
+    explain_slow_queries,
+)
+from debug_toolbar.panels.sql.tracking import (
+    resolve_deferred_fingerprints,
+    resolve_deferred_query,
+    wrap_cursor,
+)
 from debug_toolbar.panels.sql.utils import (
     contrasting_color_generator,
     reformat_sql,
 )
-from debug_toolbar.utils import render_stacktrace
+from debug_toolbar.store import RECORD_KEY_SEPARATOR
+from debug_toolbar.utils import FrameTable
 
 
 def get_isolation_level_display(vendor, level):
@@ -81,31 +98,86 @@ def get_transaction_status_display(vendor, level):
     return choices.get(level)
 
 
-def _similar_query_key(query):
-    return query["raw_sql"]
-
-
-def _duplicate_query_key(query):
-    raw_params = () if query["params"] is None else tuple(query["params"])
-    # repr() avoids problems because of unhashable types
-    # (e.g. lists) when used as dictionary keys.
-    # https://github.com/django-commons/django-debug-toolbar/issues/1091
-    return (query["raw_sql"], repr(raw_params))
-
-
-def _process_query_groups(query_groups, databases, colors, name):
+def _process_query_groups(group_counts, databases, colors, name):
+    """
+    Add the number of grouped queries to each database and return the color
+    of each group, keyed by (alias, fingerprint).
+    """
     counts = defaultdict(int)
-    for (alias, _key), query_group in query_groups.items():
-        count = len(query_group)
+    group_colors = {}
+    for key, count in group_counts.items():
         # Queries are similar / duplicates only if there are at least 2 of them.
         if count > 1:
-            color = next(colors)
-            for query in query_group:
-                query[f"{name}_count"] = count
-                query[f"{name}_color"] = color
-            counts[alias] += count
+            group_colors[key] = next(colors)
+            counts[key[0]] += count
     for alias, db_info in databases.items():
         db_info[f"{name}_count"] = counts[alias]
+    return group_colors
+
+
+def _annotate_query_group(query, key, group_counts, group_colors, name):
+    if key in group_colors:
+        query[f"{name}_count"] = group_counts[key]
+        query[f"{name}_color"] = group_colors[key]
+
+
+_DJANGO_DIR = os.path.dirname(django.__file__) + os.sep
+
+# The keys of the queries needed by the select, explain and profile views.
+_QUERY_RECORD_KEYS = ("alias", "vendor", "sql", "raw_sql", "params", "duration")
+
+
+def _get_call_site(stacktrace):
+    """
+    Return the (file name, line number) of the innermost frame of the stack
+    trace outside of Django itself, or None if the stack trace is empty.
+    """
+    for frame in reversed(stacktrace):
+        if not frame[0].startswith(_DJANGO_DIR):
+            return frame[0], frame[1]
+    if stacktrace:
+        return stacktrace[-1][0], stacktrace[-1][1]
+    return None
+
+
+def _find_n_plus_one_queries(queries, similar_counts, similar_durations, threshold):
+    """
+    Cluster the queries of large groups of similar queries by their call site.
+
+    The counts and durations come from the exact per-group totals, split
+    between the call sites of the group's recorded queries, so they account
+    for the queries that were only summarized.
+    """
+    call_sites = defaultdict(lambda: defaultdict(int))
+    for query in queries:
+        key = (query["alias"], query["fingerprint"])
+        if similar_counts[key] >= threshold:
+            call_site = _get_call_site(query["stacktrace"])
+            if call_site is not None:
+                call_sites[key][call_site] += 1
+
+    n_plus_one = []
+    for key, recorded_by_call_site in call_sites.items():
+        recorded = sum(recorded_by_call_site.values())
+        for (filename, lineno), recorded_count in recorded_by_call_site.items():
+            share = recorded_count / recorded
+            count = round(similar_counts[key] * share)
+            if count < threshold:
+                continue
+            duration = similar_durations[key] * share
+            n_plus_one.append(
+                {
+                    "alias": key[0],
+                    "filename": filename,
+                    "lineno": lineno,
+                    "count": count,
+                    "duration": duration,
+                    # Fetching the rows at once costs about one query.
+                    "saving": duration * (count - 1) / count,
+                }
+            )
+    n_plus_one.sort(key=lambda entry: -entry["duration"])
+    return n_plus_one
 
 
 class SQLPanel(Panel):
@@ -123,6 +195,25 @@ class SQLPanel(Panel):
         self._databases = {}
         # synthetic transaction IDs, keyed by DB alias
         self._transaction_ids = {}
+        # Once SQL_MAX_RECORDED_QUERIES is reached, only the slowest queries
+        # (a heap of (duration, position, query)) and a sample of the others
+        # are kept in full. The rest only count towards the aggregates.
+        self._num_queries = 0
+        self._slowest_queries = []
+        self._sampled_queries = []
+        # The number of queries with each fingerprint, keyed by
+        # (alias, fingerprint), including the queries that weren't kept.
+        self._similar_counts = defaultdict(int)
+        self._similar_durations = defaultdict(float)
+        self._duplicate_counts = defaultdict(int)
+        self._load_capture_limits()
+
+    def _load_capture_limits(self):
+        config = dt_settings.get_config()
+        self._max_recorded_queries = config["SQL_MAX_RECORDED_QUERIES"]
+        self._max_slowest_queries = config["SQL_SLOWEST_RECORDED_QUERIES"]
+        self._n_plus_one_threshold = config["SQL_N_PLUS_ONE_THRESHOLD"]
+        self._sample_rate = min(max(config["SQL_QUERY_SAMPLE_RATE"], 0), 1)
 
     def new_transaction_id(self, alias):
         """
@@ -145,19 +236,98 @@ class SQLPanel(Panel):
             trans_id = self.new_transaction_id(alias)
         return trans_id
 
-    def record(self, **kwargs):
-        kwargs["djdt_query_id"] = uuid.uuid4().hex
-        self._queries.append(kwargs)
-        alias = kwargs["alias"]
+    def _is_sampled(self, position):
+        # A query is sampled whenever the expected number of sampled queries
+        # reaches the next integer, which spreads them evenly for any rate.
+        # Only the position is used, since this is called for each query
+        # both before and after it's recorded.
+        index = position - self._max_recorded_queries
+        return self._sample_rate > 0 and math.floor(
+            index * self._sample_rate
+        ) > math.floor((index - 1) * self._sample_rate)
+
+    def wants_details(self, duration):
+        """
+        Return whether the next query should be recorded in full.
+
+        When this returns False, the query should be passed to
+        record_summary() instead of record().
+        """
+        position = self._num_queries
+        if self._max_recorded_queries is None:
+            return True
+        if position < self._max_recorded_queries or self._is_sampled(position):
+            return True
+        slowest = self._slowest_queries
+        return self._max_slowest_queries > 0 and (
+            len(slowest) < self._max_slowest_queries or duration > slowest[0][0]
+        )
+
+    def _count_query(self, alias, duration, fingerprint, duplicate_fingerprint):
+        position = self._num_queries
+        self._num_queries += 1
         if alias not in self._databases:
             self._databases[alias] = {
-                "time_spent": kwargs["duration"],
+                "time_spent": duration,
                 "num_queries": 1,
             }
         else:
-            self._databases[alias]["time_spent"] += kwargs["duration"]
+            self._databases[alias]["time_spent"] += duration
             self._databases[alias]["num_queries"] += 1
-        self._sql_time += kwargs["duration"]
+        self._sql_time += duration
+        # The fingerprints of queries recorded with SQL_DEFERRED_CAPTURE are
+        # computed and counted by _count_deferred_fingerprints().
+        if fingerprint is not None:
+            self._count_fingerprints(
+                alias, duration, fingerprint, duplicate_fingerprint
+            )
+        return position
+
+    def _count_fingerprints(self, alias, duration, fingerprint, duplicate_fingerprint):
+        self._similar_counts[(alias, fingerprint)] += 1
+        self._similar_durations[(alias, fingerprint)] += duration
+        self._duplicate_counts[(alias, duplicate_fingerprint)] += 1
+
+    def _count_deferred_fingerprints(self, queries):
+        for query in queries:
+            if resolve_deferred_fingerprints(query):
+                self._count_fingerprints(
+                    query["alias"],
+                    query["duration"],
+                    query["fingerprint"],
+                    query["duplicate_fingerprint"],
+                )
+
+    def record(self, **kwargs):
+        kwargs["djdt_query_id"] = uuid.uuid4().hex
+        position = self._count_query(
+            kwargs["alias"],
+            kwargs["duration"],
+            kwargs["fingerprint"],
+            kwargs["duplicate_fingerprint"],
+        )
+        if self._max_recorded_queries is None or position < self._max_recorded_queries:
+            self._queries.append(kwargs)
+        elif self._is_sampled(position):
+            self._sampled_queries.append((position, kwargs))
+        else:
+            heapq.heappush(
+                self._slowest_queries, (kwargs["duration"], position, kwargs)
+            )
+            if len(self._slowest_queries) > self._max_slowest_queries:
+                _duration, _position, dropped = heapq.heappop(self._slowest_queries)
+                self._count_deferred_fingerprints([dropped])
+
+    def record_summary(self, *, alias, duration, fingerprint, duplicate_fingerprint):
+        """
+        Count a query towards the aggregates without keeping its details.
+        """
+        self._count_query(alias, duration, fingerprint, duplicate_fingerprint)
+
+    n_plus_one_message = _(
+        "N+1 queries at {filename}:{lineno} ({count} queries, {duration:.2f} ms). "
+        "Fetching them at once could save about {saving:.2f} ms."
+    )
 
     # Implement the Panel API
 
@@ -166,7 +336,7 @@ class SQLPanel(Panel):
     @property
     def nav_subtitle(self):
         stats = self.get_stats()
-        query_count = len(stats.get("queries", []))
+        query_count = len(stats.get("queries", [])) + stats.get("summarized_count", 0)
         return ngettext(
             "%(query_count)d query in %(sql_time).2fms",
             "%(query_count)d queries in %(sql_time).2fms",
@@ -192,7 +362,13 @@ class SQLPanel(Panel):
         return [
             path("sql_select/", views.sql_select, name="sql_select"),
             path("sql_explain/", views.sql_explain, name="sql_explain"),
+            path(
+                "sql_explain_slow/",
+                views.sql_explain_slow,
+                name="sql_explain_slow",
+            ),
             path("sql_profile/", views.sql_profile, name="sql_profile"),
+            path("sql_queries/", views.sql_queries, name="sql_queries"),
         ]
 
     async def aenable_instrumentation(self):
@@ -204,6 +380,7 @@ class SQLPanel(Panel):
 
     def enable_instrumentation(self):
         # This is thread-safe because database connections are thread-local.
+        self._load_capture_limits()
         for connection in connections.all():
             wrap_cursor(connection)
             connection._djdt_logger = self
@@ -212,11 +389,42 @@ class SQLPanel(Panel):
         for connection in connections.all():
             connection._djdt_logger = None
 
+    def _get_recorded_queries(self):
+        if not self._sampled_queries and not self._slowest_queries:
+            return self._queries
+        # Put the queries kept past the limit back in execution order.
+        extra_queries = self._sampled_queries + [
+            (position, query) for _duration, position, query in self._slowest_queries
+        ]
+        extra_queries.sort(key=lambda item: item[0])
+        return self._queries + [query for _position, query in extra_queries]
+
+    def _intern_stack_traces(self, queries):
+        """
+        Replace the stack traces of the queries with the ids of their frames,
+        and return these frames.
+        """
+        frame_table = self.toolbar.frame_table
+        frames, traces = frame_table.extract(
+            frame_table.add(query["stacktrace"]) for query in queries
+        )
+        for query, trace in zip(queries, traces):
+            query["stacktrace"] = trace
+        return frames
+
     def generate_stats(self, request, response):
-        similar_query_groups = defaultdict(list)
-        duplicate_query_groups = defaultdict(list)
+        queries = self._get_recorded_queries()
+        self._count_deferred_fingerprints(queries)
 
-        if self._queries:
+        group_colors = contrasting_color_generator()
+        similar_colors = _process_query_groups(
+            self._similar_counts, self._databases, group_colors, "similar"
+        )
+        duplicate_colors = _process_query_groups(
+            self._duplicate_counts, self._databases, group_colors, "duplicate"
+        )
+
+        if queries:
             sql_warning_threshold = dt_settings.get_config()["SQL_WARNING_THRESHOLD"]
 
             width_ratio_tally = 0
@@ -238,12 +446,23 @@ class SQLPanel(Panel):
 
             # the last query recorded for each DB alias
             last_by_alias = {}
-            for query in self._queries:
+            for query in queries:
+                resolve_deferred_query(query)
                 alias = query["alias"]
 
-                similar_query_groups[(alias, _similar_query_key(query))].append(query)
-                duplicate_query_groups[(alias, _duplicate_query_key(query))].append(
-                    query
+                _annotate_query_group(
+                    query,
+                    (alias, query["fingerprint"]),
+                    self._similar_counts,
+                    similar_colors,
+                    "similar",
+                )
+                _annotate_query_group(
+                    query,
+                    (alias, query["duplicate_fingerprint"]),
+                    self._duplicate_counts,
+                    duplicate_colors,
+                    "duplicate",
                 )
 
                 trans_id = query.get("trans_id")
@@ -288,51 +507,164 @@ class SQLPanel(Panel):
                 if final_query.get("trans_id") is not None:
                     final_query["ends_trans"] = True
 
-        group_colors = contrasting_color_generator()
-        _process_query_groups(
-            similar_query_groups, self._databases, group_colors, "similar"
-        )
-        _process_query_groups(
-            duplicate_query_groups, self._databases, group_colors, "duplicate"
-        )
+        n_plus_one = self._detect_n_plus_one_queries(queries)
+        frames = self._intern_stack_traces(queries)
+
+        # The stats are generated on the event loop for ASGI requests, where
+        # opening a cursor isn't allowed. The slow queries can still be
+        # explained with the panel's button.
+        if (
+            queries
+            and dt_settings.get_config()["SQL_EXPLAIN_SLOW_QUERIES"]
+            and not isinstance(request, ASGIRequest)
+        ):
+            explain_slow_queries(queries)
 
         self.record_stats(
             {
                 "databases": sorted(
                     self._databases.items(), key=lambda x: -x[1]["time_spent"]
                 ),
-                "queries": self._queries,
+                "queries": queries,
                 "sql_time": self._sql_time,
+                "summarized_count": self._num_queries - len(queries),
+                "n_plus_one": n_plus_one,
+                "frames": frames,
             }
         )
+        self._save_query_chunks(queries)
+
+    # The queries that can be selected, explained or profiled are also stored
+    # in chunks of this size, so that these views only load a few queries
+    # from the store rather than the whole panel. The chunks aren't loaded
+    # with the other panels' stats when a toolbar is fetched.
+    query_chunk_size = 100
+
+    @classmethod
+    def get_query_chunk_key(cls, query_index):
+        return RECORD_KEY_SEPARATOR.join(
+            [cls.panel_id, "queries", str(query_index // cls.query_chunk_size)]
+        )
+
+    def _save_query_chunks(self, queries):
+        chunks = defaultdict(dict)
+        for index, query in enumerate(queries):
+            if query["params"]:
+                chunks[self.get_query_chunk_key(index)][query["djdt_query_id"]] = {
+                    key: query[key] for key in _QUERY_RECORD_KEYS
+                }
+        for chunk_key, records in chunks.items():
+            self.toolbar.stats[chunk_key] = records
+            self.toolbar.save_stats(chunk_key)
+
+    def _detect_n_plus_one_queries(self, queries):
+        if not queries or self._n_plus_one_threshold is None:
+            return []
+        n_plus_one = _find_n_plus_one_queries(
+            queries,
+            self._similar_counts,
+            self._similar_durations,
+            self._n_plus_one_threshold,
+        )
+        if n_plus_one:
+            self._add_n_plus_one_alerts(n_plus_one)
+        return n_plus_one
+
+    def _add_n_plus_one_alerts(self, n_plus_one):
+        try:
+            alerts_panel = self.toolbar.get_panel_by_id("AlertsPanel")
+        except KeyError:
+            return
+        if not alerts_panel.enabled:
+            return
+        for entry in n_plus_one:
+            alerts_panel.add_alert({"alert": self.n_plus_one_message.format(**entry)})
+        # The alerts panel may have generated its stats already.
+        alerts_panel.record_stats({"alerts": alerts_panel.alerts})
 
     def generate_server_timing(self, request, response):
         stats = self.get_stats()
-        title = "SQL {} queries".format(len(stats.get("queries", [])))
+        query_count = len(stats.get("queries", [])) + stats.get("summarized_count", 0)
+        title = f"SQL {query_count} queries"
         value = stats.get("sql_time", 0)
         self.record_server_timing("sql_time", title, value)
 
-    # Cache the content property since it manipulates the queries in the stats
-    # This allows the caller to treat content as idempotent
+    @property
+    def scripts(self):
+        scripts = super().scripts
+        scripts.append(static("debug_toolbar/js/sql.js"))
+        return scripts
+
+    def get_filter_form(self, data=None):
+        """
+        Return the form filtering the panel's queries.
+        """
+        aliases = [alias for alias, _info in self.get_stats().get("databases", [])]
+        return SQLQueriesFilterForm(
+            data,
+            initial={"request_id": self.toolbar.request_id},
+            aliases=aliases,
+        )
+
+    def render_queries(self, indexed_queries, page_number=None):
+        """
+        Render a page of the given (index, query) pairs.
+
+        Only the queries of the page are formatted, since formatting the SQL
+        and stack traces is expensive. The queries are copied so the stats,
+        which may be shared by a toolbar fetched from the store, keep their
+        raw values.
+        """
+        page_obj = Paginator(
+            indexed_queries, dt_settings.get_config()["SQL_QUERIES_PER_PAGE"]
+        ).get_page(page_number)
+        colors = contrasting_color_generator()
+        trace_colors = defaultdict(lambda: next(colors))
+        frame_table = FrameTable(self.get_stats().get("frames", []))
+
+        queries = []
+        for index, raw_query in page_obj:
+            query = dict(raw_query, index=index)
+            query["sql"] = reformat_sql(query["sql"], with_toggle=True)
+            query["form"] = SignedDataForm(
+                auto_id=None,
+                initial=SQLSelectForm(
+                    initial={
+                        "djdt_query_id": query["djdt_query_id"],
+                        "query_index": index,
+                        "request_id": self.toolbar.request_id,
+                    }
+                ).initial,
+            )
+            query["stacktrace"] = frame_table.render(query["stacktrace"])
+            query["trace_color"] = trace_colors[query["stacktrace"]]
+            queries.append(query)
+        return render_to_string(
+            "debug_toolbar/panels/sql_queries.html",
+            {"queries": queries, "page_obj": page_obj},
+        )
+
+    # Cache the content property since formatting the queries is expensive.
     @cached_property
     def content(self):
         if self.has_content:
             stats = self.get_stats()
-            colors = contrasting_color_generator()
-            trace_colors = defaultdict(lambda: next(colors))
-
-            for query in stats.get("queries", []):
-                query["sql"] = reformat_sql(query["sql"], with_toggle=True)
-                query["form"] = SignedDataForm(
-                    auto_id=None,
-                    initial=SQLSelectForm(
-                        initial={
-                            "djdt_query_id": query["djdt_query_id"],
-                            "request_id": self.toolbar.request_id,
-                        }
-                    ).initial,
-                )
-                query["stacktrace"] = render_stacktrace(query["stacktrace"])
-                query["trace_color"] = trace_colors[query["stacktrace"]]
-
-            return render_to_string(self.template, stats)
+            queries = stats.get("queries", [])
+            explain_slow_form = SignedDataForm(
+                auto_id=None,
+                initial=SQLExplainSlowQueriesForm(
+                    initial={"request_id": self.toolbar.request_id}
+                ).initial,
+            )
+            return render_to_string(
+                self.template,
+                {
+                    **stats,
+                    "has_queries": bool(queries),
+                    "has_slow_queries": any(query["is_slow"] for query in queries),
+                    "explain_slow_form": explain_slow_form,
+                    "filter_form": self.get_filter_form(),
+                    # The other pages are rendered by the sql_queries view.
+                    "queries_page": self.render_queries(list(enumerate(queries))),
+                },
+            )
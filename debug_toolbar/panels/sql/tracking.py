@@ -2,14 +2,29 @@ import contextlib
 import contextvars
 import datetime
 import json
+import re
+from functools import cache
 from time import perf_counter
 
 import django.test.testcases
 from django.apps import apps
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connections
 
 from debug_toolbar import settings as dt_settings
+from debug_toolbar.panels.sql.utils import (
+    get_duplicate_fingerprint,
+    get_query_fingerprint,
+)
 from debug_toolbar.sanitize import force_str
-from debug_toolbar.utils import get_stack_trace, get_template_info
+from debug_toolbar.utils import (
+    get_raw_stack_trace,
+    get_stack_trace,
+    get_stack_trace_from_raw,
+    get_template_info,
+    get_template_info_from_reference,
+    get_template_reference,
+)
 
 try:
     import psycopg
@@ -35,6 +50,35 @@ DDT_MODELS = {
 }
 
 
+@cache
+def _get_table_matcher():
+    """
+    Return a regular expression matching the tables in DDT_MODELS.
+
+    It's compiled once rather than for each query, so the cache must be
+    cleared whenever DDT_MODELS changes, see add_toolbar_table().
+    """
+    if not DDT_MODELS:
+        return None
+    # Longest names first so that a name can't shadow a longer one.
+    names = sorted(DDT_MODELS, key=len, reverse=True)
+    return re.compile("|".join(map(re.escape, names)))
+
+
+def add_toolbar_table(table):
+    """Add a table to DDT_MODELS so that its queries aren't recorded."""
+    DDT_MODELS.add(table)
+    _get_table_matcher.cache_clear()
+
+
+def is_toolbar_query(sql):
+    """
+    Return whether the SQL references one of the tables in DDT_MODELS.
+    """
+    matcher = _get_table_matcher()
+    return matcher is not None and matcher.search(sql) is not None
+
+
 class SQLQueryTriggered(Exception):
     """Thrown when template panel triggers a query"""
 
@@ -87,6 +131,8 @@ def wrap_cursor(connection):
         connection.chunked_cursor = chunked_cursor
 
 
+# Cache the classes so that wrapping each cursor doesn't create a new class.
+@cache
 def patch_cursor_wrapper_with_mixin(base_wrapper, mixin):
     class DjDTCursorWrapper(mixin, base_wrapper):
         pass
@@ -111,31 +157,114 @@ class ExceptionCursorMixin(DjDTCursorWrapperMixin):
         raise SQLQueryTriggered()
 
 
+def _decode(param):
+    if PostgresJson and isinstance(param, PostgresJson):
+        # psycopg3
+        if hasattr(param, "obj"):
+            return param.dumps(param.obj)
+        # psycopg2
+        if hasattr(param, "adapted"):
+            return param.dumps(param.adapted)
+
+    # If a sequence type, decode each element separately
+    if isinstance(param, (tuple, list)):
+        return [_decode(element) for element in param]
+
+    # If a dictionary type, decode each value separately
+    if isinstance(param, dict):
+        return {key: _decode(value) for key, value in param.items()}
+
+    # make sure datetime, date and time are converted to string by force_str
+    CONVERT_TYPES = (datetime.datetime, datetime.date, datetime.time)
+    return force_str(param, strings_only=not isinstance(param, CONVERT_TYPES))
+
+
+def encode_params(params):
+    with contextlib.suppress(TypeError):
+        # object JSON serializable?
+        return json.dumps(_decode(params))
+    return ""
+
+
+def _has_stateless_last_executed_query(db):
+    """
+    Whether ``last_executed_query()`` only depends on the SQL and parameters
+    rather than on the cursor's state, so it can run after other queries.
+    """
+    return db.vendor == "sqlite" or (
+        db.vendor == "postgresql" and db.features.uses_server_side_binding
+    )
+
+
+def resolve_deferred_fingerprints(query):
+    """
+    Fill in the fingerprints of a query recorded with ``SQL_DEFERRED_CAPTURE``.
+
+    Return whether they were missing, in which case the query hasn't been
+    counted towards its similar and duplicate groups yet.
+    """
+    if query.get("fingerprint") is not None or "deferred" not in query:
+        return False
+    raw_sql, params = query["raw_sql"], query["deferred"][0]
+    query["fingerprint"] = get_query_fingerprint(raw_sql)
+    try:
+        query["duplicate_fingerprint"] = get_duplicate_fingerprint(raw_sql, params)
+    except Exception:
+        # The parameters can't be represented, so don't consider the query
+        # a duplicate of any other.
+        query["duplicate_fingerprint"] = query["djdt_query_id"]
+    return True
+
+
+def resolve_deferred_query(query):
+    """
+    Fill in the values of a query recorded with ``SQL_DEFERRED_CAPTURE`` that
+    were left unprocessed while the request was running.
+
+    The parameters, frames and template nodes may be arbitrary objects by
+    then, so a value that can't be processed falls back to the raw query or to
+    an empty one rather than preventing the panel from rendering.
+    """
+    resolve_deferred_fingerprints(query)
+    deferred = query.pop("deferred", None)
+    if deferred is None:
+        return
+    params, raw_stack, template_reference = deferred
+    if query["sql"] is None:
+        db = connections[query["alias"]]
+        try:
+            query["sql"] = db.ops.last_executed_query(None, query["raw_sql"], params)
+        except Exception:
+            query["sql"] = query["raw_sql"]
+    with contextlib.suppress(Exception):
+        query["params"] = encode_params(params)
+    with contextlib.suppress(Exception):
+        query["stacktrace"] = get_stack_trace_from_raw(raw_stack)
+    with contextlib.suppress(Exception):
+        query["template_info"] = get_template_info_from_reference(template_reference)
+
+
 class NormalCursorMixin(DjDTCursorWrapperMixin):
     """
     Wraps a cursor and logs queries.
     """
 
+    def __init__(self, cursor, db, logger):
+        super().__init__(cursor, db, logger)
+        # Read the settings once per cursor rather than once per query.
+        config = dt_settings.get_config()
+        self._skip_toolbar_queries = config["SKIP_TOOLBAR_QUERIES"]
+        self._deferred_capture = config["SQL_DEFERRED_CAPTURE"]
+        # The stats of ASGI requests are generated on the event loop, away
+        # from the connection's thread, so their SQL is resolved right away.
+        self._defer_last_executed_query = (
+            self._deferred_capture
+            and _has_stateless_last_executed_query(db)
+            and not isinstance(logger.toolbar.request, ASGIRequest)
+        )
+
     def _decode(self, param):
-        if PostgresJson and isinstance(param, PostgresJson):
-            # psycopg3
-            if hasattr(param, "obj"):
-                return param.dumps(param.obj)
-            # psycopg2
-            if hasattr(param, "adapted"):
-                return param.dumps(param.adapted)
-
-        # If a sequence type, decode each element separately
-        if isinstance(param, (tuple, list)):
-            return [self._decode(element) for element in param]
-
-        # If a dictionary type, decode each value separately
-        if isinstance(param, dict):
-            return {key: self._decode(value) for key, value in param.items()}
-
-        # make sure datetime, date and time are converted to string by force_str
-        CONVERT_TYPES = (datetime.datetime, datetime.date, datetime.time)
-        return force_str(param, strings_only=not isinstance(param, CONVERT_TYPES))
+        return _decode(param)
 
     def _last_executed_query(self, sql, params):
         """Get the last executed query from the connection."""
@@ -165,11 +294,6 @@ class NormalCursorMixin(DjDTCursorWrapperMixin):
         finally:
             stop_time = perf_counter()
             duration = (stop_time - start_time) * 1000
-            _params = ""
-            with contextlib.suppress(TypeError):
-                # object JSON serializable?
-                _params = json.dumps(self._decode(params))
-            template_info = get_template_info()
 
             # Sql might be an object (such as psycopg Composed).
             # For logging purposes, make sure it's str.
@@ -181,25 +305,15 @@ class NormalCursorMixin(DjDTCursorWrapperMixin):
             else:
                 sql = str(sql)
 
-            kwargs = {
-                "vendor": vendor,
-                "alias": alias,
-                "sql": self._last_executed_query(sql, params),
-                "duration": duration,
-                "raw_sql": sql,
-                "params": _params,
-                "stacktrace": get_stack_trace(skip=2),
-                "template_info": template_info,
-            }
+            # Skip tracking for toolbar models by default.
+            # This can be overridden by setting SKIP_TOOLBAR_QUERIES = False
+            # The decision is made before collecting the query's details,
+            # which is the costly part of recording it.
+            skip_query = self._skip_toolbar_queries and is_toolbar_query(sql)
+            # Past SQL_MAX_RECORDED_QUERIES, most queries are only counted.
+            record_details = not skip_query and self.logger.wants_details(duration)
 
             if vendor == "postgresql":
-                # If an erroneous query was ran on the connection, it might
-                # be in a state where checking isolation_level raises an
-                # exception.
-                try:
-                    iso_level = conn.isolation_level
-                except conn.InternalError:
-                    iso_level = "unknown"
                 # PostgreSQL does not expose any sort of transaction ID, so it is
                 # necessary to generate synthetic transaction IDs here.  If the
                 # connection was not in a transaction when the query started, and was
@@ -211,6 +325,8 @@ class NormalCursorMixin(DjDTCursorWrapperMixin):
                 # case where Django can start a transaction before the first query
                 # executes, so in that case logger.current_transaction_id() will
                 # generate a new transaction ID since one does not already exist.
+                # This also runs for skipped queries so that the IDs of the
+                # following queries stay correct.
                 final_conn_status = conn.info.transaction_status
                 if final_conn_status == STATUS_IN_TRANSACTION:
                     if initial_conn_status == STATUS_IN_TRANSACTION:
@@ -220,21 +336,72 @@ class NormalCursorMixin(DjDTCursorWrapperMixin):
                 else:
                     trans_id = None
 
-                kwargs.update(
-                    {
-                        "trans_id": trans_id,
-                        "trans_status": conn.info.transaction_status,
-                        "iso_level": iso_level,
+            if record_details:
+                if self._deferred_capture:
+                    # Only keep references to the raw data here, the SQL panel
+                    # processes them with resolve_deferred_query() once the
+                    # response is ready.
+                    if self._defer_last_executed_query:
+                        last_executed_query = None
+                    else:
+                        last_executed_query = self._last_executed_query(sql, params)
+                    kwargs = {
+                        "vendor": vendor,
+                        "alias": alias,
+                        "sql": last_executed_query,
+                        "duration": duration,
+                        "raw_sql": sql,
+                        # Filled in by resolve_deferred_fingerprints().
+                        "fingerprint": None,
+                        "duplicate_fingerprint": None,
+                        "params": "",
+                        "stacktrace": [],
+                        "template_info": None,
+                        "deferred": (
+                            params,
+                            get_raw_stack_trace(skip=2),
+                            get_template_reference(),
+                        ),
+                    }
+                else:
+                    kwargs = {
+                        "vendor": vendor,
+                        "alias": alias,
+                        "sql": self._last_executed_query(sql, params),
+                        "duration": duration,
+                        "raw_sql": sql,
+                        "fingerprint": get_query_fingerprint(sql),
+                        "duplicate_fingerprint": get_duplicate_fingerprint(sql, params),
+                        "params": encode_params(params),
+                        "stacktrace": get_stack_trace(skip=2),
+                        "template_info": get_template_info(),
                     }
-                )
 
-            # Skip tracking for toolbar models by default.
-            # This can be overridden by setting SKIP_TOOLBAR_QUERIES = False
-            if not dt_settings.get_config()["SKIP_TOOLBAR_QUERIES"] or not any(
-                table in sql for table in DDT_MODELS
-            ):
+                if vendor == "postgresql":
+                    # If an erroneous query was ran on the connection, it might
+                    # be in a state where checking isolation_level raises an
+                    # exception.
+                    try:
+                        iso_level = conn.isolation_level
+                    except conn.InternalError:
+                        iso_level = "unknown"
+                    kwargs.update(
+                        {
+                            "trans_id": trans_id,
+                            "trans_status": conn.info.transaction_status,
+                            "iso_level": iso_level,
+                        }
+                    )
+
                 # We keep `sql` to maintain backwards compatibility
                 self.logger.record(**kwargs)
+            elif not skip_query:
+                self.logger.record_summary(
+                    alias=alias,
+                    duration=duration,
+                    fingerprint=get_query_fingerprint(sql),
+                    duplicate_fingerprint=get_duplicate_fingerprint(sql, params),
+                )
 
     def callproc(self, procname, params=None):
         return self._record(super().callproc, procname, params)
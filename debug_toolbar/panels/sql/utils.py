@@ -1,3 +1,6 @@
+import hashlib
+import json
+import re
 from functools import cache, lru_cache
 from html import escape
 from itertools import cycle
@@ -88,18 +91,80 @@ class EscapedStringSerializer:
         return "".join(escaped_value(token) for token in stmt.flatten())
 
 
+# The literals of a query are replaced with these markers before formatting,
+# so that similar queries share their formatted SQL. The markers lex as the
+# literals they replace, which keeps the formatting unchanged.
+_STRING_MARKER = "'\x00'"
+_INTEGER_MARKER = "9007199254740993"
+_FLOAT_MARKER = "9007199254740995.5"
+_MARKERS_RE = re.compile(
+    "|".join(map(re.escape, [_STRING_MARKER, _FLOAT_MARKER, _INTEGER_MARKER]))
+)
+
+
 def reformat_sql(sql, *, with_toggle=False):
-    formatted = parse_sql(sql)
+    tokens = list(sqlparse.lexer.tokenize(sql))
+    formatted = format_tokens(sql, tokens)
     if not with_toggle:
         return formatted
-    simplified = parse_sql(sql, simplify=True)
+    simplified = simplify_tokens(tokens)
 
     uncollapsed = f'<span class="djDebugUncollapsed">{simplified}</span>'
     collapsed = f'<span class="djDebugCollapsed djdt-hidden">{formatted}</span>'
     return collapsed + uncollapsed
 
 
-@lru_cache(maxsize=128)
+def format_tokens(sql, tokens):
+    """
+    Format the SQL of ``tokens`` with ``parse_sql``.
+
+    The SQL is formatted with its literals replaced by markers, so that the
+    cache of ``parse_sql`` is shared by queries that only differ by their
+    parameters. The escaped literals are then substituted for the markers.
+    """
+    literals = []
+    normalized = []
+    for token_type, value in tokens:
+        if token_type is T.String.Single:
+            literals.append(escape(value, quote=False))
+            normalized.append(_STRING_MARKER)
+        elif token_type is T.Number.Integer:
+            literals.append(value)
+            normalized.append(_INTEGER_MARKER)
+        elif token_type is T.Number.Float:
+            literals.append(value)
+            normalized.append(_FLOAT_MARKER)
+        else:
+            normalized.append(value)
+    if not literals or _MARKERS_RE.search(sql):
+        return parse_sql(sql)
+    parts = _MARKERS_RE.split(parse_sql("".join(normalized)))
+    if len(parts) != len(literals) + 1:
+        return parse_sql(sql)
+    formatted = [parts[0]]
+    for literal, part in zip(literals, parts[1:]):
+        formatted.append(literal)
+        formatted.append(part)
+    return "".join(formatted)
+
+
+def simplify_tokens(tokens):
+    """
+    Render ``tokens`` without their top-level select lists, as
+    ``parse_sql(sql, simplify=True)`` does, without grouping the tokens.
+    """
+    simplified = []
+    for token_type, value in ElideSelectListsFilter().process(iter(tokens)):
+        if token_type in T.Keyword:
+            simplified.append(f"<strong>{escape(value, quote=False)}</strong>")
+        elif token_type in (T.Other, T.Whitespace):
+            simplified.append(value)
+        else:
+            simplified.append(escape(value, quote=False))
+    return "".join(simplified)
+
+
+@lru_cache(maxsize=512)
 def parse_sql(sql, *, simplify=False):
     stack = get_filter_stack(simplify=simplify)
     try:
@@ -136,6 +201,153 @@ def clear_caches(*, setting, **kwargs):
         get_filter_stack.cache_clear()
 
 
+# Lists of placeholders, e.g. in ``IN (%s, %s, %s)``, and multi-row
+# ``VALUES (...), (...)`` clauses vary in length with the data.
+_PLACEHOLDER_LIST_RE = re.compile(r"\(\s*%s(?:\s*,\s*%s)+\s*\)")
+_VALUES_ROWS_RE = re.compile(r"(\bVALUES\s*\([^()]*\))(?:\s*,\s*\([^()]*\))+", re.I)
+
+
+def _hash(value):
+    return hashlib.blake2b(value.encode(), digest_size=8).hexdigest()
+
+
+@lru_cache(maxsize=512)
+def get_query_fingerprint(raw_sql):
+    """
+    Return a hash identifying queries that are similar to ``raw_sql``.
+
+    Similar queries have the same SQL, up to the length of their lists of
+    parameters, but potentially different parameters.
+    """
+    normalized = _PLACEHOLDER_LIST_RE.sub("(%s)", raw_sql)
+    normalized = _VALUES_ROWS_RE.sub(r"\1", normalized)
+    return _hash(normalized)
+
+
+def get_duplicate_fingerprint(raw_sql, params):
+    """
+    Return a hash identifying queries that are duplicates of this one: they
+    execute exactly the same SQL and parameters.
+    """
+    # repr() handles unhashable and non JSON serializable parameters.
+    # https://github.com/django-commons/django-debug-toolbar/issues/1091
+    return _hash(f"{raw_sql}\0{params!r}")
+
+
+# Sequential scans that read at least this many rows are highlighted.
+SEQ_SCAN_WARNING_ROWS = 1000
+# Row estimates that are off by at least this factor are highlighted.
+ROWS_ESTIMATE_WARNING_FACTOR = 10
+
+
+def _is_estimate_miss(estimated_rows, actual_rows):
+    estimated_rows = max(estimated_rows, 1)
+    actual_rows = max(actual_rows, 1)
+    ratio = max(estimated_rows, actual_rows) / min(estimated_rows, actual_rows)
+    return ratio >= ROWS_ESTIMATE_WARNING_FACTOR
+
+
+def parse_postgresql_plan(result):
+    """
+    Turn the rows returned by PostgreSQL's ``EXPLAIN (ANALYZE, FORMAT JSON)``
+    into a list of plan nodes, in depth-first order.
+
+    Each node is a dict with its ``depth`` in the tree, a ``label``, its total
+    ``time`` in milliseconds, the ``estimated_rows`` and ``actual_rows`` per
+    loop, the number of ``loops`` and a list of ``warnings``: ``"seq_scan"``
+    for sequential scans that read many rows and ``"estimate"`` for row
+    estimates that are far off.
+    """
+    [[plan]] = result
+    # psycopg decodes json columns, but the plan may also come as text.
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    nodes = []
+    stack = [(plan[0]["Plan"], 0)]
+    while stack:
+        node, depth = stack.pop()
+        label = node["Node Type"]
+        if "Relation Name" in node:
+            label = f"{label} on {node['Relation Name']}"
+        if "Index Name" in node:
+            label = f"{label} using {node['Index Name']}"
+        loops = node.get("Actual Loops", 1)
+        estimated_rows = node.get("Plan Rows")
+        actual_rows = node.get("Actual Rows")
+        warnings = []
+        if actual_rows is not None:
+            rows_read = (actual_rows + node.get("Rows Removed by Filter", 0)) * loops
+            if node["Node Type"] == "Seq Scan" and rows_read >= SEQ_SCAN_WARNING_ROWS:
+                warnings.append("seq_scan")
+            if estimated_rows is not None and _is_estimate_miss(
+                estimated_rows, actual_rows
+            ):
+                warnings.append("estimate")
+        time = node.get("Actual Total Time")
+        nodes.append(
+            {
+                "depth": depth,
+                "label": label,
+                "time": None if time is None else time * loops,
+                "estimated_rows": estimated_rows,
+                "actual_rows": actual_rows,
+                "loops": loops,
+                "warnings": warnings,
+            }
+        )
+        stack.extend((child, depth + 1) for child in reversed(node.get("Plans", [])))
+    return nodes
+
+
+def parse_sqlite_plan(result):
+    """
+    Turn the rows returned by SQLite's ``EXPLAIN QUERY PLAN`` into a list of
+    plan nodes, in depth-first order.
+
+    The nodes have the same keys as the ones of
+    :func:`parse_postgresql_plan`. SQLite doesn't report times or row counts,
+    and full table scans are always highlighted, except for the scans of a
+    constant row, such as a ``SELECT`` without a ``FROM`` clause.
+    """
+    depths = {0: -1}
+    nodes = []
+    # The rows are (id, parent, notused, detail), already in depth-first order.
+    for node_id, parent_id, _notused, detail in result:
+        depth = depths.get(parent_id, -1) + 1
+        depths[node_id] = depth
+        warnings = []
+        if (
+            detail.startswith("SCAN ")
+            and detail != "SCAN CONSTANT ROW"
+            and " INDEX " not in detail
+        ):
+            warnings.append("seq_scan")
+        nodes.append(
+            {
+                "depth": depth,
+                "label": detail,
+                "time": None,
+                "estimated_rows": None,
+                "actual_rows": None,
+                "loops": None,
+                "warnings": warnings,
+            }
+        )
+    return nodes
+
+
+def parse_plan(vendor, result):
+    """
+    Return the plan nodes for the result of EXPLAIN, or None if the database
+    isn't supported.
+    """
+    if vendor == "postgresql":
+        return parse_postgresql_plan(result)
+    if vendor == "sqlite":
+        return parse_sqlite_plan(result)
+    return None
+
+
 def contrasting_color_generator():
     return cycle(
         [
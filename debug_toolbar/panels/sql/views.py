@@ -1,12 +1,15 @@
 from django.http import HttpResponseBadRequest, JsonResponse
 from django.template.loader import render_to_string
+from django.utils.html import escape
+from django.utils.translation import gettext as _
 from django.views.decorators.csrf import csrf_exempt
 
 from debug_toolbar._compat import login_not_required
 from debug_toolbar.decorators import render_with_toolbar_language, require_show_toolbar
 from debug_toolbar.forms import SignedDataForm
-from debug_toolbar.panels.sql.forms import SQLSelectForm
-from debug_toolbar.panels.sql.utils import reformat_sql
+from debug_toolbar.panels.sql.forms import SQLExplainSlowQueriesForm, SQLSelectForm
+from debug_toolbar.panels.sql.utils import parse_plan, reformat_sql
+from debug_toolbar.toolbar import DebugToolbar
 
 
 def get_signed_data(request):
@@ -59,6 +62,11 @@ def sql_explain(request):
         query = form.cleaned_data["query"]
         result, headers = form.explain()
         context = {
+            "plan": {
+                "result": result,
+                "headers": headers,
+                "nodes": parse_plan(query["vendor"], result),
+            },
             "result": result,
             "sql": reformat_sql(query["sql"], with_toggle=False),
             "duration": query["duration"],
@@ -70,6 +78,35 @@ def sql_explain(request):
     return HttpResponseBadRequest("Form errors")
 
 
+@csrf_exempt
+@login_not_required
+@require_show_toolbar
+@render_with_toolbar_language
+def sql_explain_slow(request):
+    """Returns the output of the SQL EXPLAIN on each group of slow queries"""
+    verified_data = get_signed_data(request)
+    if not verified_data:
+        return HttpResponseBadRequest("Invalid signature")
+    form = SQLExplainSlowQueriesForm(verified_data)
+
+    if form.is_valid():
+        queries = [
+            {
+                "sql": reformat_sql(query["sql"], with_toggle=False),
+                "duration": query["duration"],
+                "similar_count": query.get("similar_count"),
+                "alias": query["alias"],
+                "explain": query["explain"],
+            }
+            for query in form.explain()
+        ]
+        content = render_to_string(
+            "debug_toolbar/panels/sql_explain_slow.html", {"queries": queries}
+        )
+        return JsonResponse({"content": content})
+    return HttpResponseBadRequest("Form errors")
+
+
 @csrf_exempt
 @login_not_required
 @require_show_toolbar
@@ -104,3 +141,30 @@ def sql_profile(request):
         content = render_to_string("debug_toolbar/panels/sql_profile.html", context)
         return JsonResponse({"content": content})
     return HttpResponseBadRequest("Form errors")
+
+
+@login_not_required
+@require_show_toolbar
+@render_with_toolbar_language
+def sql_queries(request):
+    """Returns a page of the SQL panel's queries, filtered by the query string"""
+    from debug_toolbar.panels.sql import SQLPanel
+
+    request_id = request.GET.get("request_id")
+    if not request_id:
+        return HttpResponseBadRequest("Form errors")
+    toolbar = DebugToolbar.fetch(request_id, SQLPanel.panel_id)
+    if toolbar is None:
+        content = _(
+            "Data for this panel isn't available anymore. "
+            "Please reload the page and retry."
+        )
+        return JsonResponse({"content": f"<p>{escape(content)}</p>"})
+    panel = toolbar.get_panel_by_id(SQLPanel.panel_id)
+    form = panel.get_filter_form(request.GET)
+
+    if form.is_valid():
+        queries = form.filter(panel.get_stats()["queries"])
+        content = panel.render_queries(queries, form.cleaned_data["page"])
+        return JsonResponse({"content": content})
+    return HttpResponseBadRequest("Form errors")
@@ -27,13 +27,20 @@ CONFIG_DEFAULTS = {
     "INSERT_BEFORE": "</body>",
     "IS_RUNNING_TESTS": _is_running_tests(),
     "OBSERVE_REQUEST_CALLBACK": "debug_toolbar.toolbar.observe_request",
+    "REDIS_TTL": 60 * 60,  # seconds
+    "REDIS_URL": "redis://localhost:6379/0",
     "RENDER_PANELS": None,
+    "RESULTS_CACHE_CLEANUP_INTERVAL": 10,
+    "RESULTS_CACHE_MAX_BYTES": None,
     "RESULTS_CACHE_SIZE": 25,
     "ROOT_TAG_EXTRA_ATTRS": "",
     "SHOW_COLLAPSED": False,
     "SHOW_TOOLBAR_CALLBACK": "debug_toolbar.middleware.show_toolbar",
     "USE_SHADOW_DOM": True,
     "TOOLBAR_LANGUAGE": None,
+    "TOOLBAR_COMPRESSOR": None,
+    "TOOLBAR_COMPRESSION_THRESHOLD": 16384,  # bytes
+    "TOOLBAR_SERIALIZER": "debug_toolbar.store.JSONSerializer",
     "TOOLBAR_STORE_CLASS": "debug_toolbar.store.MemoryStore",
     "UPDATE_ON_FETCH": False,
     # Panel options
@@ -52,6 +59,7 @@ CONFIG_DEFAULTS = {
         "django.utils.deprecation",
         "django.utils.functional",
     ),
+    "LAZY_STACKTRACES": False,
     "PRETTIFY_SQL": True,
     "PROFILER_CAPTURE_PROJECT_CODE": True,
     "PROFILER_MAX_DEPTH": 10,
@@ -59,6 +67,13 @@ CONFIG_DEFAULTS = {
     "SHOW_TEMPLATE_CONTEXT": True,
     "SKIP_TEMPLATE_PREFIXES": ("django/forms/widgets/", "admin/widgets/"),
     "SKIP_TOOLBAR_QUERIES": True,
+    "SQL_DEFERRED_CAPTURE": False,
+    "SQL_EXPLAIN_SLOW_QUERIES": False,
+    "SQL_MAX_RECORDED_QUERIES": None,
+    "SQL_N_PLUS_ONE_THRESHOLD": 5,
+    "SQL_QUERIES_PER_PAGE": 100,
+    "SQL_QUERY_SAMPLE_RATE": 0,
+    "SQL_SLOWEST_RECORDED_QUERIES": 10,
     "SQL_WARNING_THRESHOLD": 500,  # milliseconds
 }
 
@@ -114,10 +129,14 @@ def update_toolbar_config(*, setting, **kwargs):
     Refresh configuration when overriding settings.
     """
     if setting == "DEBUG_TOOLBAR_CONFIG":
+        from debug_toolbar.toolbar import StoredDebugToolbar
+
         get_config.cache_clear()
+        StoredDebugToolbar.clear_recent()
     elif setting == "DEBUG_TOOLBAR_PANELS":
-        from debug_toolbar.toolbar import DebugToolbar
+        from debug_toolbar.toolbar import DebugToolbar, StoredDebugToolbar
 
         get_panels.cache_clear()
         DebugToolbar._panel_classes = None
+        StoredDebugToolbar.clear_recent()
         # Not implemented: invalidate debug_toolbar.urls.
@@ -0,0 +1,34 @@
+import { $$, ajaxForm, getDebugElement } from "./utils.js";
+
+const djDebug = getDebugElement();
+
+function loadQueries(form, page) {
+    form.elements.page.value = page;
+    ajaxForm(form).then((data) => {
+        const container = djDebug.querySelector("#SQLPanel .djdt-sql-queries");
+        container.innerHTML = data.content;
+        $$.applyStyles(container);
+    });
+}
+
+function getFilterForm() {
+    return djDebug.querySelector("#SQLPanel .djdt-sql-filter");
+}
+
+$$.on(djDebug, "submit", ".djdt-sql-filter", function (event) {
+    event.preventDefault();
+    this.elements.fingerprint.value = "";
+    loadQueries(this, 1);
+});
+
+$$.on(djDebug, "click", ".djdt-sql-page", function (event) {
+    event.preventDefault();
+    loadQueries(getFilterForm(), this.dataset.page);
+});
+
+$$.on(djDebug, "click", ".djdt-sql-similar", function (event) {
+    event.preventDefault();
+    const form = getFilterForm();
+    form.elements.fingerprint.value = this.dataset.fingerprint;
+    loadQueries(form, 1);
+});
@@ -1,19 +1,49 @@
-import contextlib
+import base64
 import functools
 import json
-from collections import defaultdict, deque
+import threading
+import time
+import zlib
+from collections import OrderedDict
 from collections.abc import Iterable
 from typing import Any
 
 from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
 from django.core.serializers.json import DjangoJSONEncoder
-from django.db import transaction
+from django.db import connections, router, transaction
+from django.utils import timezone
 from django.utils.module_loading import import_string
 
 from debug_toolbar import settings as dt_settings
 from debug_toolbar.models import HistoryEntry
 from debug_toolbar.sanitize import force_str
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
 
 class DebugToolbarJSONEncoder(DjangoJSONEncoder):
     def default(self, o):
@@ -23,15 +53,255 @@ class DebugToolbarJSONEncoder(DjangoJSONEncoder):
             return force_str(o)
 
 
+class JSONSerializer:
+    """
+    Serialize panel data as JSON with the standard library.
+
+    Values that aren't JSON serializable are converted with ``force_str`` and
+    mapping keys that can't be serialized are skipped.
+    """
+
+    # Stored data that doesn't start with a known format tag is JSON, which
+    # keeps data stored before format tags were introduced readable.
+    format_tag = ""
+
+    @classmethod
+    def dumps(cls, data: Any) -> str:
+        return json.dumps(data, cls=DebugToolbarJSONEncoder, skipkeys=True)
+
+    @classmethod
+    def loads(cls, data: str) -> Any:
+        return json.loads(data)
+
+
+def _require(module, name: str, package: str):
+    """Return the optional module, which the given class requires."""
+    if module is None:
+        raise ImproperlyConfigured(f"{name} requires the {package} package.")
+    return module
+
+
+class OrjsonSerializer(JSONSerializer):
+    """
+    Serialize panel data as JSON with orjson. Requires the orjson package.
+
+    Falls back to :class:`JSONSerializer` when orjson can't serialize the
+    data, such as when a mapping key isn't serializable.
+    """
+
+    @classmethod
+    def dumps(cls, data: Any) -> str:
+        _require(orjson, cls.__name__, "orjson")
+        try:
+            return orjson.dumps(
+                data,
+                default=_json_encoder.default,
+                option=orjson.OPT_NON_STR_KEYS
+                | orjson.OPT_PASSTHROUGH_DATACLASS
+                | orjson.OPT_PASSTHROUGH_DATETIME,
+            ).decode()
+        except TypeError:
+            return super().dumps(data)
+
+    @classmethod
+    def loads(cls, data: str) -> Any:
+        return _require(orjson, cls.__name__, "orjson").loads(data)
+
+
+class MsgpackSerializer:
+    """
+    Serialize panel data with msgpack. Requires the msgpack package.
+
+    The packed data is base64 encoded so every store can keep it as text.
+    Falls back to :class:`JSONSerializer` when msgpack can't serialize the
+    data.
+    """
+
+    format_tag = "\x01"
+
+    @classmethod
+    def dumps(cls, data: Any) -> str:
+        _require(msgpack, cls.__name__, "msgpack")
+        try:
+            packed = msgpack.packb(
+                data, default=_json_encoder.default, use_bin_type=False
+            )
+        except (TypeError, ValueError, OverflowError):
+            return JSONSerializer.dumps(data)
+        return cls.format_tag + base64.b64encode(packed).decode("ascii")
+
+    @classmethod
+    def loads(cls, data: str) -> Any:
+        return _require(msgpack, cls.__name__, "msgpack").unpackb(
+            base64.b64decode(data[len(cls.format_tag) :]),
+            raw=False,
+            strict_map_key=False,
+            unicode_errors="replace",
+        )
+
+
+class ZlibCompressor:
+    """
+    Compress serialized panel data with zlib.
+    """
+
+    format_tag = "\x02"
+
+    @classmethod
+    def compress(cls, data: bytes) -> bytes:
+        return zlib.compress(data)
+
+    @classmethod
+    def decompress(cls, data: bytes) -> bytes:
+        return zlib.decompress(data)
+
+
+class LZ4Compressor:
+    """
+    Compress serialized panel data with LZ4. Requires the lz4 package.
+    """
+
+    format_tag = "\x03"
+
+    @classmethod
+    def compress(cls, data: bytes) -> bytes:
+        return _require(lz4, cls.__name__, "lz4").frame.compress(data)
+
+    @classmethod
+    def decompress(cls, data: bytes) -> bytes:
+        return _require(lz4, cls.__name__, "lz4").frame.decompress(data)
+
+
+class ZstdCompressor:
+    """
+    Compress serialized panel data with Zstandard. Requires the zstandard
+    package.
+    """
+
+    format_tag = "\x04"
+
+    @classmethod
+    def compress(cls, data: bytes) -> bytes:
+        module = _require(zstandard, cls.__name__, "zstandard")
+        return module.ZstdCompressor().compress(data)
+
+    @classmethod
+    def decompress(cls, data: bytes) -> bytes:
+        module = _require(zstandard, cls.__name__, "zstandard")
+        return module.ZstdDecompressor().decompress(data)
+
+
+class CompressionStats:
+    """
+    Counters of the serialized panel data that has been compressed, to help
+    tune ``TOOLBAR_COMPRESSION_THRESHOLD``.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.compressed = 0
+            self.skipped = 0
+            self.original_bytes = 0
+            self.compressed_bytes = 0
+
+    def record(self, original_size: int, compressed_size: int | None):
+        with self._lock:
+            if compressed_size is None:
+                self.skipped += 1
+            else:
+                self.compressed += 1
+                self.original_bytes += original_size
+                self.compressed_bytes += compressed_size
+
+    def as_dict(self) -> dict[str, int | float]:
+        with self._lock:
+            return {
+                "compressed": self.compressed,
+                "skipped": self.skipped,
+                "original_bytes": self.original_bytes,
+                "compressed_bytes": self.compressed_bytes,
+                "ratio": (
+                    self.original_bytes / self.compressed_bytes
+                    if self.compressed_bytes
+                    else 0
+                ),
+            }
+
+
+compression_stats = CompressionStats()
+_json_encoder = DebugToolbarJSONEncoder()
+# Serializers and compressors whose data starts with a format tag, keyed by
+# that tag.
+_tagged_serializers = {MsgpackSerializer.format_tag: MsgpackSerializer}
+_tagged_compressors = {
+    compressor.format_tag: compressor
+    for compressor in (ZlibCompressor, LZ4Compressor, ZstdCompressor)
+}
+
+
+def get_serializer():
+    return import_string(dt_settings.get_config()["TOOLBAR_SERIALIZER"])
+
+
+def _compress(data: str) -> str:
+    config = dt_settings.get_config()
+    if config["TOOLBAR_COMPRESSOR"] is None:
+        return data
+    raw = data.encode()
+    if len(raw) < config["TOOLBAR_COMPRESSION_THRESHOLD"]:
+        compression_stats.record(len(raw), None)
+        return data
+    compressor = import_string(config["TOOLBAR_COMPRESSOR"])
+    compressed = compressor.format_tag + base64.b64encode(
+        compressor.compress(raw)
+    ).decode("ascii")
+    if len(compressed) >= len(raw):
+        # Not worth storing compressed.
+        compression_stats.record(len(raw), None)
+        return data
+    compression_stats.record(len(raw), len(compressed))
+    return compressed
+
+
+def _decompress(data: str) -> str:
+    compressor = _tagged_compressors.get(data[:1])
+    if compressor is None:
+        return data
+    return compressor.decompress(base64.b64decode(data[1:])).decode()
+
+
+def _size(data: str) -> int:
+    """Return the size of serialized data in bytes once encoded."""
+    return len(data) if data.isascii() else len(data.encode())
+
+
 def serialize(data: Any) -> str:
-    # If this starts throwing an exceptions, consider
-    # Subclassing DjangoJSONEncoder and using force_str to
-    # make it JSON serializable.
-    return json.dumps(data, cls=DebugToolbarJSONEncoder, skipkeys=True)
+    return _compress(get_serializer().dumps(data))
 
 
 def deserialize(data: str) -> Any:
-    return json.loads(data)
+    data = _decompress(data)
+    serializer = _tagged_serializers.get(data[:1])
+    if serializer is None:
+        # The data is JSON, read it with the configured serializer if it can.
+        serializer = get_serializer()
+        if serializer.format_tag:
+            serializer = JSONSerializer
+    return serializer.loads(data)
+
+
+# Panels may store additional records next to their stats, such as the SQL
+# panel's query chunks, under keys containing this separator. These records
+# are only loaded on demand with ``panel()`` and are skipped by ``panels()``.
+RECORD_KEY_SEPARATOR = ":"
+
+
+def is_panel_key(key: str) -> bool:
+    return RECORD_KEY_SEPARATOR not in key
 
 
 class BaseStore:
@@ -65,6 +335,12 @@ class BaseStore:
         """Save the panel data for the given request_id"""
         raise NotImplementedError
 
+    @classmethod
+    def save_panels(cls, request_id: str, panels: dict[str, Any]):
+        """Save the data for several panels of the given request_id at once"""
+        for panel_id, data in panels.items():
+            cls.save_panel(request_id, panel_id, data)
+
     @classmethod
     def panel(cls, request_id: str, panel_id: str) -> Any:
         """Fetch the panel data for the given request_id"""
@@ -72,52 +348,125 @@ class BaseStore:
 
 
 class MemoryStore(BaseStore):
-    # ids is the collection of storage ids that have been used.
-    # Use a dequeue to support O(1) appends and pops
-    # from either direction.
-    _request_ids: deque = deque()
-    _request_store: dict[str, dict] = defaultdict(dict)
+    # _request_store maps each request id to its serialized panel data. The
+    # dict keeps insertion order, so the oldest request is always first and
+    # membership, inserts, eviction and deletes are all O(1).
+    _request_store: OrderedDict[str, dict[str, str]] = OrderedDict()
+    # Guards _request_store against concurrent mutation from threaded servers.
+    _lock = threading.Lock()
+    # Total serialized size of the stored panel data and the number of
+    # requests evicted so far, used by RESULTS_CACHE_MAX_BYTES and usage().
+    _stored_bytes = 0
+    _evictions = 0
+
+    @classmethod
+    def _evict_oldest(cls):
+        """Evict the oldest stored request. Must be called with the lock held."""
+        _, panels = cls._request_store.popitem(last=False)
+        cls._stored_bytes -= sum(map(_size, panels.values()))
+        cls._evictions += 1
+
+    @classmethod
+    def _set(cls, request_id: str) -> dict[str, str]:
+        """
+        Add the request_id to the request store, evicting the oldest requests
+        beyond RESULTS_CACHE_SIZE. Must be called with the lock held.
+        """
+        panels = cls._request_store.get(request_id)
+        if panels is None:
+            panels = cls._request_store[request_id] = {}
+            cache_size = dt_settings.get_config()["RESULTS_CACHE_SIZE"]
+            # As with DatabaseStore, a RESULTS_CACHE_SIZE below 1 doesn't
+            # evict any request.
+            while len(cls._request_store) > cache_size >= 1:
+                cls._evict_oldest()
+        return panels
+
+    @classmethod
+    def _save(cls, request_id: str, panels: dict[str, str]):
+        """
+        Store the serialized panels and evict the oldest requests until the
+        total fits RESULTS_CACHE_MAX_BYTES. Must be called with the lock held.
+        """
+        stored = cls._set(request_id)
+        if request_id not in cls._request_store:
+            return
+        for panel_id, data in panels.items():
+            previous = stored.get(panel_id)
+            if previous is not None:
+                cls._stored_bytes -= _size(previous)
+            cls._stored_bytes += _size(data)
+            stored[panel_id] = data
+        max_bytes = dt_settings.get_config()["RESULTS_CACHE_MAX_BYTES"]
+        if max_bytes is None:
+            return
+        # The request being saved is never evicted, even when it alone
+        # exceeds the budget, so that its toolbar can still be rendered.
+        while (
+            cls._stored_bytes > max_bytes
+            and cls._request_store
+            and next(iter(cls._request_store)) != request_id
+        ):
+            cls._evict_oldest()
+
+    @classmethod
+    def usage(cls) -> dict[str, Any]:
+        """
+        Return the number of stored requests, their total serialized size in
+        bytes and the number of requests evicted so far.
+        """
+        with cls._lock:
+            return {
+                "requests": len(cls._request_store),
+                "bytes": cls._stored_bytes,
+                "max_bytes": dt_settings.get_config()["RESULTS_CACHE_MAX_BYTES"],
+                "evictions": cls._evictions,
+            }
 
     @classmethod
     def request_ids(cls) -> Iterable:
         """The stored request ids"""
-        return cls._request_ids
+        with cls._lock:
+            return list(cls._request_store)
 
     @classmethod
     def exists(cls, request_id: str) -> bool:
         """Does the given request_id exist in the request store"""
-        return request_id in cls._request_ids
+        return request_id in cls._request_store
 
     @classmethod
     def set(cls, request_id: str):
         """Set a request_id in the request store"""
-        if request_id not in cls._request_ids:
-            cls._request_ids.append(request_id)
-        for _ in range(
-            len(cls._request_ids) - dt_settings.get_config()["RESULTS_CACHE_SIZE"]
-        ):
-            removed_id = cls._request_ids.popleft()
-            cls._request_store.pop(removed_id, None)
+        with cls._lock:
+            cls._set(request_id)
 
     @classmethod
     def clear(cls):
         """Remove all requests from the request store"""
-        cls._request_ids.clear()
-        cls._request_store.clear()
+        with cls._lock:
+            cls._request_store.clear()
+            cls._stored_bytes = 0
 
     @classmethod
     def delete(cls, request_id: str):
         """Delete the stored request for the given request_id"""
-        cls._request_store.pop(request_id, None)
-        # Suppress when request_id doesn't exist in the collection of ids.
-        with contextlib.suppress(ValueError):
-            cls._request_ids.remove(request_id)
+        with cls._lock:
+            panels = cls._request_store.pop(request_id, {})
+            cls._stored_bytes -= sum(map(_size, panels.values()))
 
     @classmethod
     def save_panel(cls, request_id: str, panel_id: str, data: Any = None):
         """Save the panel data for the given request_id"""
-        cls.set(request_id)
-        cls._request_store[request_id][panel_id] = serialize(data)
+        data = serialize(data)
+        with cls._lock:
+            cls._save(request_id, {panel_id: data})
+
+    @classmethod
+    def save_panels(cls, request_id: str, panels: dict[str, Any]):
+        """Save the data for several panels of the given request_id at once"""
+        panels = {panel_id: serialize(data) for panel_id, data in panels.items()}
+        with cls._lock:
+            cls._save(request_id, panels)
 
     @classmethod
     def panel(cls, request_id: str, panel_id: str) -> Any:
@@ -132,27 +481,61 @@ class MemoryStore(BaseStore):
     @classmethod
     def panels(cls, request_id: str) -> Any:
         """Fetch all the panel data for the given request_id"""
-        try:
-            panel_mapping = cls._request_store[request_id]
-        except KeyError:
-            return {}
-        for panel, data in panel_mapping.items():
-            yield panel, deserialize(data)
+        with cls._lock:
+            try:
+                panel_mapping = list(cls._request_store[request_id].items())
+            except KeyError:
+                return {}
+        for panel, data in panel_mapping:
+            if is_panel_key(panel):
+                yield panel, deserialize(data)
 
 
 class DatabaseStore(BaseStore):
+    # Number of entries created by this process since the last cleanup, used
+    # to run the cleanup every RESULTS_CACHE_CLEANUP_INTERVAL new requests.
+    _created_since_cleanup = 0
+    _cleanup_lock = threading.Lock()
+
     @classmethod
-    def _cleanup_old_entries(cls):
+    def _cleanup_old_entries(cls) -> int:
         """
         Enforce the cache size limit - keeping only the most recently used entries
-        up to RESULTS_CACHE_SIZE.
+        up to RESULTS_CACHE_SIZE. Return the number of deleted entries.
+
+        Nothing is deleted when RESULTS_CACHE_SIZE is lower than 1.
         """
-        # Determine which entries to keep
-        keep_ids = cls.request_ids()
+        cache_size = dt_settings.get_config()["RESULTS_CACHE_SIZE"]
+        if cache_size < 1:
+            return 0
+
+        # Find the creation time of the oldest entry to keep with an indexed
+        # lookup, then delete everything older than it.
+        cutoff = (
+            HistoryEntry.objects.order_by("-created_at")
+            .values_list("created_at", flat=True)[cache_size - 1 : cache_size]
+            .first()
+        )
+        if cutoff is None:
+            return 0
+        deleted, _ = HistoryEntry.objects.filter(created_at__lt=cutoff).delete()
+        return deleted
 
-        # Delete all entries not in the keep list
-        if keep_ids:
-            HistoryEntry.objects.exclude(request_id__in=keep_ids).delete()
+    @classmethod
+    def _cleanup_due(cls) -> bool:
+        """
+        Count a newly created entry and return whether the cleanup should run,
+        which happens every RESULTS_CACHE_CLEANUP_INTERVAL new entries.
+        """
+        interval = dt_settings.get_config()["RESULTS_CACHE_CLEANUP_INTERVAL"]
+        if interval is None:
+            return False
+        with cls._cleanup_lock:
+            cls._created_since_cleanup += 1
+            if cls._created_since_cleanup < interval:
+                return False
+            cls._created_since_cleanup = 0
+            return True
 
     @classmethod
     def request_ids(cls):
@@ -170,13 +553,13 @@ class DatabaseStore(BaseStore):
     @classmethod
     def set(cls, request_id: str):
         """Set a request_id in the store and clean up old entries"""
-        with transaction.atomic():
-            # Create the entry if it doesn't exist (ignore otherwise)
-            _, created = HistoryEntry.objects.get_or_create(request_id=request_id)
+        # Create the entry if it doesn't exist (ignore otherwise)
+        _, created = HistoryEntry.objects.get_or_create(request_id=request_id)
 
-            # Only enforce cache size limit when new entries are created
-            if created:
-                cls._cleanup_old_entries()
+        # Only enforce cache size limit when new entries are created, and
+        # amortize it over RESULTS_CACHE_CLEANUP_INTERVAL of them
+        if created and cls._cleanup_due():
+            cls._cleanup_old_entries()
 
     @classmethod
     def clear(cls):
@@ -189,15 +572,67 @@ class DatabaseStore(BaseStore):
         HistoryEntry.objects.filter(request_id=request_id).delete()
 
     @classmethod
-    def save_panel(cls, request_id: str, panel_id: str, data: Any = None):
-        """Save the panel data for the given request_id"""
+    def _upsert_panels(cls, request_id: str, panels: dict[str, str]) -> bool:
+        """
+        Merge the serialized panels into the request's entry with a single
+        ``INSERT ... ON CONFLICT`` statement. Return ``False`` when the
+        database vendor isn't supported so the caller can fall back to the ORM.
+        """
+        connection = connections[router.db_for_write(HistoryEntry)]
+        if connection.vendor not in {"postgresql", "sqlite"}:
+            return False
+
+        opts = HistoryEntry._meta
+        created_at = opts.get_field("created_at")
+        quote_name = connection.ops.quote_name
+        table = quote_name(opts.db_table)
+        pk_column = quote_name(opts.pk.column)
+        data_column = quote_name(opts.get_field("data").column)
+        if connection.vendor == "postgresql":
+            value = "%s::jsonb"
+            merged = f"{table}.{data_column} || EXCLUDED.{data_column}"
+        else:
+            value = "%s"
+            merged = f"json_patch({table}.{data_column}, EXCLUDED.{data_column})"
+        sql = (
+            f"INSERT INTO {table} ({pk_column}, {data_column}, "
+            f"{quote_name(created_at.column)}) VALUES (%s, {value}, %s) "
+            f"ON CONFLICT ({pk_column}) DO UPDATE SET {data_column} = {merged}"
+        )
+        params = [
+            opts.pk.get_db_prep_value(request_id, connection),
+            json.dumps(panels),
+            created_at.get_db_prep_value(timezone.now(), connection),
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+        return True
+
+    @classmethod
+    def _save(cls, request_id: str, panels: dict[str, str]):
+        """Save the serialized panels for the given request_id"""
+        if cls._upsert_panels(request_id, panels):
+            return
         with transaction.atomic():
             obj, _ = HistoryEntry.objects.get_or_create(request_id=request_id)
             store_data = obj.data
-            store_data[panel_id] = serialize(data)
+            store_data.update(panels)
             obj.data = store_data
             obj.save()
 
+    @classmethod
+    def save_panel(cls, request_id: str, panel_id: str, data: Any = None):
+        """Save the panel data for the given request_id"""
+        cls._save(request_id, {panel_id: serialize(data)})
+
+    @classmethod
+    def save_panels(cls, request_id: str, panels: dict[str, Any]):
+        """Save the data for several panels of the given request_id at once"""
+        cls._save(
+            request_id,
+            {panel_id: serialize(data) for panel_id, data in panels.items()},
+        )
+
     @classmethod
     def panel(cls, request_id: str, panel_id: str) -> Any:
         """Fetch the panel data for the given request_id"""
@@ -216,7 +651,8 @@ class DatabaseStore(BaseStore):
         try:
             data = HistoryEntry.objects.get(request_id=request_id).data
             for panel_id, panel_data in data.items():
-                yield panel_id, deserialize(panel_data)
+                if is_panel_key(panel_id):
+                    yield panel_id, deserialize(panel_data)
         except HistoryEntry.DoesNotExist:
             return {}
 
@@ -253,9 +689,17 @@ class _UntrackedCache:
 class CacheStore(BaseStore):
     """
     Store that uses Django's cache framework to persist debug toolbar data.
+
+    Requests are indexed with numbered slots. Each new request takes the next
+    slot number from a counter with ``cache.incr()`` and evicts the request
+    in the slot RESULTS_CACHE_SIZE numbers earlier, so concurrent writers
+    never rewrite a shared list of request ids.
     """
 
     _cache_table_registered = False
+    # Number of slots read at once when sweeping the slots below the stored
+    # requests, see _sweep_slots().
+    _sweep_size = 10
 
     @classmethod
     def _get_cache(cls):
@@ -288,7 +732,7 @@ class CacheStore(BaseStore):
             # store.py -> panels/sql/tracking.py -> panels/sql/forms.py -> toolbar.py -> store.py
             from debug_toolbar.panels.sql import tracking
 
-            tracking.DDT_MODELS.add(cache_table)
+            tracking.add_toolbar_table(cache_table)
 
     @classmethod
     def _key_prefix(cls) -> str:
@@ -296,81 +740,245 @@ class CacheStore(BaseStore):
         return dt_settings.get_config()["CACHE_KEY_PREFIX"]
 
     @classmethod
-    def _request_ids_key(cls) -> str:
-        """Return the cache key for the request IDs list."""
-        return f"{cls._key_prefix()}request_ids"
+    def _counter_key(cls) -> str:
+        """Return the cache key for the slot counter."""
+        return f"{cls._key_prefix()}request_counter"
+
+    @classmethod
+    def _slot_key(cls, slot: int) -> str:
+        """Return the cache key for a numbered slot."""
+        return f"{cls._key_prefix()}slot:{slot}"
 
     @classmethod
     def _request_key(cls, request_id: str) -> str:
         """Return the cache key for a specific request's data."""
         return f"{cls._key_prefix()}req:{request_id}"
 
+    @classmethod
+    def _request_size_key(cls, request_id: str) -> str:
+        """Return the cache key for the serialized size of a request."""
+        return f"{cls._key_prefix()}size:{request_id}"
+
+    @classmethod
+    def _evictions_key(cls) -> str:
+        """Return the cache key for the eviction counter."""
+        return f"{cls._key_prefix()}evictions"
+
+    @classmethod
+    def _live_slots(cls, cache) -> list[tuple[int, str]]:
+        """
+        Return the ``(slot, request_id)`` pairs of the stored requests, oldest
+        first, from the last RESULTS_CACHE_SIZE slots.
+        """
+        cache_size = max(dt_settings.get_config()["RESULTS_CACHE_SIZE"], 1)
+        counter = cache.get(cls._counter_key(), 0)
+        slot_keys = {
+            cls._slot_key(slot): slot
+            for slot in range(max(counter - cache_size + 1, 1), counter + 1)
+        }
+        values = cache.get_many(slot_keys)
+        return [
+            (slot, values[slot_key])
+            for slot_key, slot in slot_keys.items()
+            if slot_key in values
+        ]
+
+    @classmethod
+    def _incr(cls, cache, key: str, delta: int = 1) -> int:
+        """Increment the counter stored under key, creating it if needed."""
+        try:
+            return cache.incr(key, delta)
+        except ValueError:
+            # add() only creates the counter once if several writers race.
+            cache.add(key, 0, None)
+            return cache.incr(key, delta)
+
+    @classmethod
+    def _request_keys(cls, request_ids: Iterable[str]) -> list[str]:
+        """Return the cache keys holding the data of the given requests."""
+        keys = []
+        for request_id in request_ids:
+            keys += [cls._request_key(request_id), cls._request_size_key(request_id)]
+        return keys
+
+    @classmethod
+    def _evict(cls, cache, request_ids: list[str]):
+        """Delete the evicted requests' data and count the evictions."""
+        if request_ids:
+            cache.delete_many(cls._request_keys(request_ids))
+            cls._incr(cache, cls._evictions_key(), len(request_ids))
+
+    @classmethod
+    def _free_slots(cls, cache, slots: Iterable[int]) -> list[str]:
+        """Empty the slots, returning the request_ids they held."""
+        values = cache.get_many([cls._slot_key(slot) for slot in slots])
+        if values:
+            cache.delete_many(list(values))
+        return list(values.values())
+
+    @classmethod
+    def _sweep_slots(cls, cache, stop: int) -> list[str]:
+        """
+        Empty the slots below stop, returning the request_ids they held.
+
+        The slots are read in batches going down until the lowest slot of a
+        batch is empty. Usually only the slot right below stop is in use, but
+        older slots still hold requests when RESULTS_CACHE_SIZE was lowered.
+        """
+        request_ids = []
+        while stop > 1:
+            start = max(stop - cls._sweep_size, 1)
+            slot_keys = [cls._slot_key(slot) for slot in range(start, stop)]
+            values = cache.get_many(slot_keys)
+            if values:
+                cache.delete_many(list(values))
+                request_ids += values.values()
+            if slot_keys[0] not in values:
+                break
+            stop = start
+        return request_ids
+
+    @classmethod
+    def usage(cls) -> dict[str, Any]:
+        """
+        Return the number of stored requests, their total serialized size in
+        bytes and the number of requests evicted so far.
+        """
+        cache = cls._get_cache()
+        request_ids = [request_id for _, request_id in cls._live_slots(cache)]
+        evictions_key = cls._evictions_key()
+        values = cache.get_many(
+            [evictions_key, *map(cls._request_size_key, request_ids)]
+        )
+        return {
+            "requests": len(request_ids),
+            "bytes": sum(
+                values.get(cls._request_size_key(request_id), 0)
+                for request_id in request_ids
+            ),
+            "max_bytes": dt_settings.get_config()["RESULTS_CACHE_MAX_BYTES"],
+            "evictions": values.get(evictions_key, 0),
+        }
+
     @classmethod
     def request_ids(cls) -> Iterable:
         """The stored request ids."""
-        return cls._get_cache().get(cls._request_ids_key(), [])
+        return [request_id for _, request_id in cls._live_slots(cls._get_cache())]
 
     @classmethod
     def exists(cls, request_id: str) -> bool:
         """Does the given request_id exist in the store."""
-        return request_id in cls.request_ids()
+        return cls._get_cache().has_key(cls._request_key(request_id))
 
     @classmethod
     def set(cls, request_id: str):
         """Set a request_id in the store."""
         cache = cls._get_cache()
-        ids_key = cls._request_ids_key()
-        request_ids = deque(cache.get(ids_key, []))
-
-        if request_id not in request_ids:
-            request_ids.append(request_id)
+        # add() only succeeds for the first writer, so each request takes
+        # exactly one slot.
+        if not cache.add(cls._request_key(request_id), {}, None):
+            return
+        # The cache may have culled the request's data while its slot was
+        # kept, in which case the request keeps that slot.
+        if any(
+            slot_request_id == request_id
+            for _, slot_request_id in cls._live_slots(cache)
+        ):
+            return
 
-        # Enforce RESULTS_CACHE_SIZE limit
-        max_size = dt_settings.get_config()["RESULTS_CACHE_SIZE"]
-        while len(request_ids) > max_size:
-            removed_id = request_ids.popleft()
-            cache.delete(cls._request_key(removed_id))
+        slot = cls._incr(cache, cls._counter_key())
+        cache.set(cls._slot_key(slot), request_id, None)
 
-        cache.set(ids_key, list(request_ids), None)
+        # Enforce RESULTS_CACHE_SIZE limit by evicting the request stored
+        # RESULTS_CACHE_SIZE slots earlier, and any older one left over from
+        # a larger setting.
+        cache_size = max(dt_settings.get_config()["RESULTS_CACHE_SIZE"], 1)
+        cls._evict(cache, cls._sweep_slots(cache, slot - cache_size + 1))
 
     @classmethod
     def clear(cls):
         """Remove all requests from the request store."""
         cache = cls._get_cache()
-        ids_key = cls._request_ids_key()
-        request_ids = cache.get(ids_key, [])
-
-        # Delete all request data
-        if request_ids:
-            cache.delete_many([cls._request_key(_id) for _id in request_ids])
-
-        # Clear the request IDs list
-        cache.delete(ids_key)
+        counter_key = cls._counter_key()
+        counter = cache.get(counter_key, 0)
+        cache_size = max(dt_settings.get_config()["RESULTS_CACHE_SIZE"], 1)
+        start = max(counter - cache_size + 1, 1)
+        request_ids = [
+            *cls._free_slots(cache, range(start, counter + 1)),
+            *cls._sweep_slots(cache, start),
+        ]
+        cache.delete_many([counter_key, *cls._request_keys(request_ids)])
 
     @classmethod
     def delete(cls, request_id: str):
         """Delete the stored request for the given request_id."""
         cache = cls._get_cache()
-        ids_key = cls._request_ids_key()
-        request_ids = list(cache.get(ids_key, []))
+        cls._free_slots(
+            cache,
+            [
+                slot
+                for slot, slot_request_id in cls._live_slots(cache)
+                if slot_request_id == request_id
+            ],
+        )
+        cache.delete_many(cls._request_keys([request_id]))
 
-        # Remove from the list if present
-        if request_id in request_ids:
-            request_ids.remove(request_id)
-            cache.set(ids_key, request_ids, None)
+    @classmethod
+    def _save(cls, request_id: str, panels: dict[str, str]):
+        """
+        Store the serialized panels, record the request's size and evict the
+        oldest requests until the total fits RESULTS_CACHE_MAX_BYTES.
+        """
+        cache = cls._get_cache()
+        request_key = cls._request_key(request_id)
+        request_data = cache.get(request_key)
+        if request_data is None:
+            cls.set(request_id)
+            request_data = cache.get(request_key, {})
+        request_data.update(panels)
+        request_size = sum(map(_size, request_data.values()))
+        cache.set_many(
+            {
+                request_key: request_data,
+                cls._request_size_key(request_id): request_size,
+            },
+            None,
+        )
 
-        # Delete the request data
-        cache.delete(cls._request_key(request_id))
+        max_bytes = dt_settings.get_config()["RESULTS_CACHE_MAX_BYTES"]
+        if max_bytes is None:
+            return
+        live_slots = cls._live_slots(cache)
+        sizes = cache.get_many(
+            [
+                cls._request_size_key(slot_request_id)
+                for _, slot_request_id in live_slots
+            ]
+        )
+        total = sum(sizes.values())
+        evicted_slots = []
+        # The request being saved is never evicted, even when it alone
+        # exceeds the budget, so that its toolbar can still be rendered.
+        for slot, slot_request_id in live_slots:
+            if total <= max_bytes or slot_request_id == request_id:
+                break
+            total -= sizes.get(cls._request_size_key(slot_request_id), 0)
+            evicted_slots.append(slot)
+        if evicted_slots:
+            cls._evict(cache, cls._free_slots(cache, evicted_slots))
 
     @classmethod
     def save_panel(cls, request_id: str, panel_id: str, data: Any = None):
         """Save the panel data for the given request_id."""
-        cls.set(request_id)
-        cache = cls._get_cache()
-        request_key = cls._request_key(request_id)
-        request_data = cache.get(request_key, {})
-        request_data[panel_id] = serialize(data)
-        cache.set(request_key, request_data, None)
+        cls._save(request_id, {panel_id: serialize(data)})
+
+    @classmethod
+    def save_panels(cls, request_id: str, panels: dict[str, Any]):
+        """Save the data for several panels of the given request_id at once."""
+        cls._save(
+            request_id,
+            {panel_id: serialize(data) for panel_id, data in panels.items()},
+        )
 
     @classmethod
     def panel(cls, request_id: str, panel_id: str) -> Any:
@@ -388,7 +996,154 @@ class CacheStore(BaseStore):
         cache = cls._get_cache()
         request_data = cache.get(cls._request_key(request_id), {})
         for panel_id, panel_data in request_data.items():
-            yield panel_id, deserialize(panel_data)
+            if is_panel_key(panel_id):
+                yield panel_id, deserialize(panel_data)
+
+
+class RedisStore(BaseStore):
+    """
+    Store that keeps debug toolbar data in Redis.
+
+    The request ids are kept in a sorted set scored by the time they were
+    stored and each request's panels in a hash with one field per panel, so
+    writes from several processes never overwrite each other. Both expire
+    after REDIS_TTL seconds.
+    """
+
+    _clients: dict[str, Any] = {}
+
+    @classmethod
+    def _get_client(cls):
+        """Get a Redis client for REDIS_URL, reusing its connection pool."""
+        if redis is None:
+            raise ImproperlyConfigured("RedisStore requires the redis package.")
+        url = dt_settings.get_config()["REDIS_URL"]
+        client = cls._clients.get(url)
+        if client is None:
+            client = cls._clients[url] = redis.Redis.from_url(
+                url, decode_responses=True
+            )
+        return client
+
+    @classmethod
+    def _request_ids_key(cls) -> str:
+        """Return the key of the sorted set of request ids."""
+        return f"{dt_settings.get_config()['CACHE_KEY_PREFIX']}request_ids"
+
+    @classmethod
+    def _request_key(cls, request_id: str) -> str:
+        """Return the key of the hash holding a request's panels."""
+        return f"{dt_settings.get_config()['CACHE_KEY_PREFIX']}req:{request_id}"
+
+    @classmethod
+    def _min_score(cls) -> float:
+        """Return the score below which request ids have expired."""
+        ttl = dt_settings.get_config()["REDIS_TTL"]
+        return float("-inf") if ttl is None else time.time() - ttl
+
+    @classmethod
+    def _add(cls, pipeline, request_id: str):
+        """
+        Queue adding the request_id to the sorted set of request ids and
+        dropping the expired ids, ending with a count of the remaining ids.
+        """
+        ids_key = cls._request_ids_key()
+        pipeline.zadd(ids_key, {request_id: time.time()}, nx=True)
+        ttl = dt_settings.get_config()["REDIS_TTL"]
+        if ttl is not None:
+            pipeline.expire(ids_key, ttl)
+            # The hashes of the expired ids expire on their own.
+            pipeline.zremrangebyscore(ids_key, "-inf", f"({cls._min_score()}")
+        pipeline.zcard(ids_key)
+
+    @classmethod
+    def _trim(cls, client, count: int):
+        """Remove the oldest requests beyond RESULTS_CACHE_SIZE."""
+        excess = count - dt_settings.get_config()["RESULTS_CACHE_SIZE"]
+        if excess <= 0:
+            return
+        ids_key = cls._request_ids_key()
+        removed_ids = client.zrange(ids_key, 0, excess - 1)
+        if removed_ids:
+            with client.pipeline() as pipeline:
+                pipeline.zrem(ids_key, *removed_ids)
+                pipeline.delete(*map(cls._request_key, removed_ids))
+                pipeline.execute()
+
+    @classmethod
+    def request_ids(cls) -> Iterable:
+        """The stored request ids."""
+        return cls._get_client().zrangebyscore(
+            cls._request_ids_key(), cls._min_score(), "+inf"
+        )
+
+    @classmethod
+    def exists(cls, request_id: str) -> bool:
+        """Does the given request_id exist in the store."""
+        score = cls._get_client().zscore(cls._request_ids_key(), request_id)
+        return score is not None and score >= cls._min_score()
+
+    @classmethod
+    def set(cls, request_id: str):
+        """Set a request_id in the store."""
+        client = cls._get_client()
+        with client.pipeline() as pipeline:
+            cls._add(pipeline, request_id)
+            count = pipeline.execute()[-1]
+        cls._trim(client, count)
+
+    @classmethod
+    def clear(cls):
+        """Remove all requests from the request store."""
+        client = cls._get_client()
+        ids_key = cls._request_ids_key()
+        request_ids = client.zrange(ids_key, 0, -1)
+        client.delete(ids_key, *map(cls._request_key, request_ids))
+
+    @classmethod
+    def delete(cls, request_id: str):
+        """Delete the stored request for the given request_id."""
+        with cls._get_client().pipeline() as pipeline:
+            pipeline.zrem(cls._request_ids_key(), request_id)
+            pipeline.delete(cls._request_key(request_id))
+            pipeline.execute()
+
+    @classmethod
+    def save_panel(cls, request_id: str, panel_id: str, data: Any = None):
+        """Save the panel data for the given request_id."""
+        cls.save_panels(request_id, {panel_id: data})
+
+    @classmethod
+    def save_panels(cls, request_id: str, panels: dict[str, Any]):
+        """Save the data for several panels of the given request_id at once."""
+        mapping = {panel_id: serialize(data) for panel_id, data in panels.items()}
+        request_key = cls._request_key(request_id)
+        ttl = dt_settings.get_config()["REDIS_TTL"]
+        client = cls._get_client()
+        with client.pipeline() as pipeline:
+            if mapping:
+                pipeline.hset(request_key, mapping=mapping)
+            if ttl is not None:
+                pipeline.expire(request_key, ttl)
+            cls._add(pipeline, request_id)
+            count = pipeline.execute()[-1]
+        cls._trim(client, count)
+
+    @classmethod
+    def panel(cls, request_id: str, panel_id: str) -> Any:
+        """Fetch the panel data for the given request_id."""
+        panel_data = cls._get_client().hget(cls._request_key(request_id), panel_id)
+        if panel_data is None:
+            return {}
+        return deserialize(panel_data)
+
+    @classmethod
+    def panels(cls, request_id: str) -> Any:
+        """Fetch all the panel data for the given request_id."""
+        request_data = cls._get_client().hgetall(cls._request_key(request_id))
+        for panel_id, panel_data in request_data.items():
+            if is_panel_key(panel_id):
+                yield panel_id, deserialize(panel_data)
 
 
 def get_store() -> BaseStore:
@@ -4,9 +4,12 @@ The main DebugToolbar class that loads and renders the Toolbar.
 
 from __future__ import annotations
 
+import copy
 import logging
 import re
+import threading
 import uuid
+from collections import OrderedDict
 from collections.abc import Callable
 from functools import cache
 
@@ -27,7 +30,7 @@ from debug_toolbar._stubs import GetResponse
 from debug_toolbar.store import BaseStore, get_store
 
 from .panels import Panel
-from .utils import get_csp_nonce
+from .utils import FrameTable, get_csp_nonce
 
 logger = logging.getLogger(__name__)
 
@@ -42,6 +45,8 @@ class DebugToolbar:
         request: HttpRequest,
         get_response: GetResponse,
         request_id: str | None = None,
+        *,
+        buffer_stats: bool = False,
     ):
         self.request = request
         self.config = dt_settings.get_config().copy()
@@ -55,6 +60,10 @@ class DebugToolbar:
         self._panels = {panel.panel_id: panel for panel in reversed(panels)}
         self.stats = {}
         self.server_timing_stats = {}
+        # The frames of the stack traces recorded by the panels.
+        self.frame_table = FrameTable()
+        self.buffer_stats = buffer_stats
+        self._unsaved_panel_ids = {}
         self.request_id = request_id
         self.init_store()
         self._created.send(request, toolbar=self)
@@ -133,12 +142,44 @@ class DebugToolbar:
         self.request_id = uuid.uuid4().hex
         self.store.set(self.request_id)
 
+    def save_stats(self, panel_id: str):
+        """
+        Write the stats of the given panel to the store.
+
+        When ``buffer_stats`` is enabled, the write is deferred until
+        :meth:`flush_stats` is called.
+        """
+        if self.buffer_stats:
+            self._unsaved_panel_ids[panel_id] = None
+        else:
+            self.store.save_panel(self.request_id, panel_id, self.stats[panel_id])
+
+    def flush_stats(self):
+        """
+        Write all buffered panel stats to the store with a single call.
+        """
+        if not self._unsaved_panel_ids:
+            return
+        self.store.save_panels(
+            self.request_id,
+            {panel_id: self.stats[panel_id] for panel_id in self._unsaved_panel_ids},
+        )
+        self._unsaved_panel_ids.clear()
+
     @classmethod
     def fetch(
         cls, request_id: str, panel_id: str | None = None
     ) -> StoredDebugToolbar | None:
+        """
+        Fetch the toolbar for the given request_id from the store.
+
+        Only the panel ``panel_id`` is included when given. The panels' stats
+        are loaded with a single store call the first time they are accessed,
+        unless they were loaded recently, see ``StoredDebugToolbar.stats``.
+        """
         if get_store().exists(request_id):
             return StoredDebugToolbar.from_store(request_id, panel_id=panel_id)
+        return None
 
     # Manually implement class-level caching of panel classes and url patterns
     # because it's more obvious than going through an abstraction.
@@ -218,6 +259,17 @@ def from_store_get_response(request: HttpRequest | None) -> None:
 
 
 class StoredDebugToolbar(DebugToolbar):
+    # The recently loaded stats of each panel keyed by request id, least
+    # recently used first. A request's stats rarely change once its response
+    # has been processed, so fetching its panels again can skip the store.
+    # Panels may change their stats in place while rendering them, so the
+    # stats are deep-copied in and out of the cache. The cache is kept per
+    # process: it's cleared when this process saves the request's stats, but
+    # not when another process does.
+    _recent: OrderedDict[str, dict[str, dict]] = OrderedDict()
+    _recent_size = 10
+    _recent_lock = threading.Lock()
+
     def __init__(
         self,
         request: HttpRequest | None,
@@ -227,11 +279,55 @@ class StoredDebugToolbar(DebugToolbar):
         self.request = None
         self.config = dt_settings.get_config().copy()
         self.process_request = get_response
-        self.stats = {}
+        self._panels = {}
+        self._stats = None
+        self._stats_lock = threading.RLock()
         self.server_timing_stats = {}
+        self.frame_table = FrameTable()
+        self.buffer_stats = False
+        self._unsaved_panel_ids = {}
         self.request_id = request_id
         self.init_store()
 
+    @property
+    def stats(self) -> dict:
+        """
+        The panels' stats, loaded from the store on first access.
+        """
+        # Reentrant since load_stats_from_store() accesses the stats too.
+        with self._stats_lock:
+            if self._stats is None:
+                self._stats = {}
+                data = self.get_recent(self.request_id)
+                missing_ids = [
+                    panel_id for panel_id in self._panels if panel_id not in data
+                ]
+                if len(missing_ids) == 1:
+                    [panel_id] = missing_ids
+                    loaded = {panel_id: self.store.panel(self.request_id, panel_id)}
+                elif missing_ids:
+                    loaded = dict(self.store.panels(self.request_id))
+                else:
+                    loaded = {}
+                for panel_id in missing_ids:
+                    loaded.setdefault(panel_id, {})
+                if loaded:
+                    self.add_recent(self.request_id, loaded)
+                    data.update(loaded)
+                # The panels are given their own copy of the stats.
+                for panel in self._panels.values():
+                    panel.load_stats_from_store(data[panel.panel_id])
+            return self._stats
+
+    def save_stats(self, panel_id: str):
+        super().save_stats(panel_id)
+        # The recently loaded stats of the request are out of date.
+        self.forget_recent(self.request_id)
+
+    def flush_stats(self):
+        super().flush_stats()
+        self.forget_recent(self.request_id)
+
     @classmethod
     def from_store(
         cls, request_id: str, panel_id: str | None = None
@@ -239,17 +335,51 @@ class StoredDebugToolbar(DebugToolbar):
         toolbar = StoredDebugToolbar(
             None, from_store_get_response, request_id=request_id
         )
-        toolbar._panels = {}
 
         for panel_class in reversed(cls.get_panel_classes()):
-            panel = panel_class(toolbar, from_store_get_response)
-            if panel_id and panel.panel_id != panel_id:
+            if panel_id and panel_class.panel_id != panel_id:
                 continue
-            data = toolbar.store.panel(toolbar.request_id, panel.panel_id)
-            panel.load_stats_from_store(data)
+            panel = panel_class(toolbar, from_store_get_response)
+            # The stats are loaded lazily, see StoredDebugToolbar.stats.
+            panel.from_store = True
             toolbar._panels[panel.panel_id] = panel
         return toolbar
 
+    @classmethod
+    def get_recent(cls, request_id: str) -> dict[str, dict]:
+        """
+        Return the recently loaded stats of the request's panels by panel id.
+        """
+        with cls._recent_lock:
+            stats = cls._recent.get(request_id)
+            if stats is None:
+                return {}
+            cls._recent.move_to_end(request_id)
+            return copy.deepcopy(stats)
+
+    @classmethod
+    def add_recent(cls, request_id: str, stats: dict[str, dict]):
+        """
+        Remember the loaded stats of the request's panels, evicting the least
+        recently used requests.
+        """
+        stats = copy.deepcopy(stats)
+        with cls._recent_lock:
+            cls._recent.setdefault(request_id, {}).update(stats)
+            cls._recent.move_to_end(request_id)
+            while len(cls._recent) > cls._recent_size:
+                cls._recent.popitem(last=False)
+
+    @classmethod
+    def forget_recent(cls, request_id: str):
+        with cls._recent_lock:
+            cls._recent.pop(request_id, None)
+
+    @classmethod
+    def clear_recent(cls):
+        with cls._recent_lock:
+            cls._recent.clear()
+
 
 def debug_toolbar_urls(prefix: str = "__debug__") -> list[URLPattern | URLResolver]:
     """
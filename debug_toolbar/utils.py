@@ -5,7 +5,8 @@ import linecache
 import os.path
 import sys
 import warnings
-from collections.abc import Sequence
+from collections.abc import Iterable, Sequence
+from functools import lru_cache
 from pprint import PrettyPrinter, pformat
 from typing import Any
 
@@ -23,9 +24,14 @@ safe_filter = get_default_exception_reporter_filter()
 
 
 def _is_excluded_frame(frame: Any, excluded_modules: Sequence[str] | None) -> bool:
+    return _is_excluded_module(frame.f_globals.get("__name__"), excluded_modules)
+
+
+def _is_excluded_module(
+    frame_module: Any, excluded_modules: Sequence[str] | None
+) -> bool:
     if not excluded_modules:
         return False
-    frame_module = frame.f_globals.get("__name__")
     if not isinstance(frame_module, str):
         return False
     return any(
@@ -71,50 +77,130 @@ def tidy_stacktrace(stack: list[stubs.InspectStack]) -> stubs.TidyStackTrace:
 
 def render_stacktrace(trace: stubs.TidyStackTrace) -> SafeString:
     show_locals = dt_settings.get_config()["ENABLE_STACKTRACES_LOCALS"]
-    html = ""
-    for abspath, lineno, func, code, locals_ in trace:
-        if os.path.sep in abspath:
-            directory, filename = abspath.rsplit(os.path.sep, 1)
-            # We want the separator to appear in the UI so add it back.
-            directory += os.path.sep
-        else:
-            # abspath could be something like "<frozen importlib._bootstrap>"
-            directory = ""
-            filename = abspath
+    return mark_safe(
+        "".join(_render_frame(frame, show_locals=show_locals) for frame in trace)
+    )
+
+
+def _render_frame(frame: Sequence[Any], *, show_locals: bool) -> str:
+    abspath, lineno, func, code, locals_ = frame
+    if code is None:
+        code = get_source_line(abspath, lineno)
+    if os.path.sep in abspath:
+        directory, filename = abspath.rsplit(os.path.sep, 1)
+        # We want the separator to appear in the UI so add it back.
+        directory += os.path.sep
+    else:
+        # abspath could be something like "<frozen importlib._bootstrap>"
+        directory = ""
+        filename = abspath
+    html = format_html(
+        (
+            '<span class="djdt-path">{}</span>'
+            + '<span class="djdt-file">{}</span> in'
+            + ' <span class="djdt-func">{}</span>'
+            + '(<span class="djdt-lineno">{}</span>)\n'
+            + '  <span class="djdt-code">{}</span>\n'
+        ),
+        directory,
+        filename,
+        func,
+        lineno,
+        code,
+    )
+    if show_locals:
         html += format_html(
-            (
-                '<span class="djdt-path">{}</span>'
-                + '<span class="djdt-file">{}</span> in'
-                + ' <span class="djdt-func">{}</span>'
-                + '(<span class="djdt-lineno">{}</span>)\n'
-                + '  <span class="djdt-code">{}</span>\n'
-            ),
-            directory,
-            filename,
-            func,
-            lineno,
-            code,
+            '  <pre class="djdt-locals">{}</pre>\n',
+            locals_,
         )
-        if show_locals:
-            html += format_html(
-                '  <pre class="djdt-locals">{}</pre>\n',
-                locals_,
-            )
-        html += "\n"
-    return mark_safe(html)
+    return html + "\n"
 
 
-def get_template_info() -> dict[str, Any] | None:
-    template_info = None
+@lru_cache(maxsize=4096)
+def get_source_line(filename: str, line_no: int) -> str:
+    """
+    Return the source line of a frame captured without it, see the
+    ``LAZY_STACKTRACES`` setting.
+    """
+    return linecache.getline(filename, line_no).strip()
+
+
+class FrameTable:
+    """
+    Intern the frames of stack traces, so that each distinct frame is stored
+    and rendered once.
+
+    A stack trace is stored as the list of the ids of its frames, which are
+    their positions in :attr:`frames`. The panels of a request share the
+    toolbar's table while recording, and store the frames their records
+    reference alongside them, see :meth:`extract`.
+    """
+
+    def __init__(self, frames: Sequence[Sequence[Any]] = ()):
+        # The frames may come from the store, which turns tuples into lists.
+        self.frames = [tuple(frame) for frame in frames]
+        self._frame_ids = {frame: i for i, frame in enumerate(self.frames)}
+        self._rendered_frames = {}
+
+    def add(self, trace: stubs.TidyStackTrace) -> list[int]:
+        """
+        Intern the frames of ``trace`` and return their ids.
+        """
+        frame_ids = []
+        for frame in trace:
+            frame_id = self._frame_ids.get(frame)
+            if frame_id is None:
+                frame_id = self._frame_ids[frame] = len(self.frames)
+                self.frames.append(frame)
+            frame_ids.append(frame_id)
+        return frame_ids
+
+    def get(self, frame_ids: Sequence[int]) -> stubs.TidyStackTrace:
+        return [self.frames[frame_id] for frame_id in frame_ids]
+
+    def extract(
+        self, traces: Iterable[Sequence[int]]
+    ) -> tuple[list[tuple], list[list[int]]]:
+        """
+        Return the frames referenced by the given stack traces, and the traces
+        with the ids of their frames in that list instead.
+        """
+        new_ids = {}
+        new_traces = [
+            [new_ids.setdefault(frame_id, len(new_ids)) for frame_id in trace]
+            for trace in traces
+        ]
+        return [self.frames[frame_id] for frame_id in new_ids], new_traces
+
+    def render(self, frame_ids: Sequence[int]) -> SafeString:
+        """
+        Render the stack trace of the given frame ids like
+        :func:`render_stacktrace`, rendering each frame only once.
+        """
+        show_locals = dt_settings.get_config()["ENABLE_STACKTRACES_LOCALS"]
+        html = []
+        for frame_id in frame_ids:
+            rendered = self._rendered_frames.get(frame_id)
+            if rendered is None:
+                rendered = self._rendered_frames[frame_id] = _render_frame(
+                    self.frames[frame_id], show_locals=show_locals
+                )
+            html.append(rendered)
+        return mark_safe("".join(html))
+
+
+def _get_rendered_node() -> tuple[Node, stubs.RequestContext] | None:
+    """Find the template node being rendered by the callers, if any."""
     cur_frame = sys._getframe().f_back
     try:
         while cur_frame is not None:
             in_utils_module = cur_frame.f_code.co_filename.endswith(
                 "/debug_toolbar/utils.py"
             )
-            is_get_template_context = (
-                cur_frame.f_code.co_name == get_template_context.__name__
-            )
+            is_get_template_context = cur_frame.f_code.co_name in {
+                get_template_context.__name__,
+                get_template_info_from_reference.__name__,
+            }
             if in_utils_module and is_get_template_context:
                 # If the method in the stack trace is this one
                 # then break from the loop as it's being check recursively.
@@ -123,19 +209,73 @@ def get_template_info() -> dict[str, Any] | None:
                 node = cur_frame.f_locals["self"]
                 context = cur_frame.f_locals["context"]
                 if isinstance(node, Node):
-                    template_info = get_template_context(node, context)
-                    break
+                    return node, context
             cur_frame = cur_frame.f_back
     except Exception:
         pass
-    del cur_frame
-    return template_info
+    finally:
+        del cur_frame
+    return None
+
+
+def get_template_info() -> dict[str, Any] | None:
+    rendered_node = _get_rendered_node()
+    if rendered_node is None:
+        return None
+    try:
+        return get_template_context(*rendered_node)
+    except Exception:
+        return None
+
+
+def get_template_reference() -> tuple[Any, Any] | None:
+    """
+    Return the template and token being rendered by the callers, if any.
+
+    This is a cheap alternative to ``get_template_info()`` that leaves reading
+    the template source to ``get_template_info_from_reference()``.
+    """
+    rendered_node = _get_rendered_node()
+    if rendered_node is None:
+        return None
+    node, context = rendered_node
+    try:
+        if context.template.origin == node.origin:
+            return context.template, node.token
+        return context.render_context.template, node.token
+    except Exception:
+        return None
+
+
+def get_template_info_from_reference(
+    reference: tuple[Any, Any] | None, context_lines: int = 3
+) -> dict[str, Any] | None:
+    """Return the template info for a ``get_template_reference()`` result."""
+    if reference is None:
+        return None
+    template, token = reference
+    try:
+        exception_info = template.get_exception_info(Exception("DDT"), token)
+    except Exception:
+        return None
+    return _get_debug_context(
+        exception_info["line"],
+        exception_info["source_lines"],
+        exception_info["name"],
+        context_lines,
+    )
 
 
 def get_template_context(
     node: Node, context: stubs.RequestContext, context_lines: int = 3
 ) -> dict[str, Any]:
     line, source_lines, name = get_template_source_from_exception_info(node, context)
+    return _get_debug_context(line, source_lines, name, context_lines)
+
+
+def _get_debug_context(
+    line: int, source_lines: list[tuple[int, str]], name: str, context_lines: int
+) -> dict[str, Any]:
     debug_context = []
     start = max(1, line - context_lines)
     end = line + 1 + context_lines
@@ -293,18 +433,39 @@ def _stack_frames(*, skip=0):
         frame = frame.f_back
 
 
+# Resolved frames, keyed by the HIDE_IN_STACKTRACES setting and whether the
+# source lines are resolved, and then by (code object, line number), which
+# determine the file name, function name and source line of a frame and
+# whether it's hidden. They are kept across requests since they don't change
+# for the life of the process.
+_frame_caches: dict[tuple[Any, ...], dict[tuple[Any, int], Any]] = {}
+_FRAME_CACHE_SIZE = 10000
+
+
+def _get_frame_cache(
+    excluded_modules: Sequence[str] | None, *, resolve_source: bool
+) -> dict:
+    key = (tuple(excluded_modules or ()), resolve_source)
+    frame_cache = _frame_caches.get(key)
+    if frame_cache is None or len(frame_cache) >= _FRAME_CACHE_SIZE:
+        # Start over rather than keeping code objects of dynamically
+        # generated code alive forever.
+        frame_cache = _frame_caches[key] = {}
+    return frame_cache
+
+
 class _StackTraceRecorder:
     pretty_printer = PrettyPrinter()
 
     def __init__(self):
         self.filename_cache = {}
 
-    def get_source_file(self, frame):
-        frame_filename = frame.f_code.co_filename
+    def get_source_file(self, code):
+        frame_filename = code.co_filename
 
         value = self.filename_cache.get(frame_filename)
         if value is None:
-            filename = inspect.getsourcefile(frame)
+            filename = inspect.getsourcefile(code)
             if filename is None:
                 is_source = False
                 filename = frame_filename
@@ -318,43 +479,108 @@ class _StackTraceRecorder:
 
         return value
 
+    def get_frame(
+        self,
+        code,
+        line_no,
+        module_globals,
+        frame_cache,
+        excluded_modules,
+        *,
+        resolve_source=True,
+    ):
+        """
+        Return the processed frame for the code object and line number, without
+        its locals, or None if the frame is hidden.
+
+        Unless ``resolve_source`` is True, the source line is left as None for
+        :func:`render_stacktrace` to resolve if the frame is ever displayed.
+        """
+        key = (code, line_no)
+        try:
+            return frame_cache[key]
+        except KeyError:
+            pass
+        if _is_excluded_module(module_globals.get("__name__"), excluded_modules):
+            frame = None
+        elif not resolve_source:
+            frame = (code.co_filename, line_no, code.co_name, None, None)
+        else:
+            filename, is_source = self.get_source_file(code)
+            if is_source:
+                source_line = linecache.getline(
+                    filename, line_no, module_globals
+                ).strip()
+            else:
+                source_line = ""
+            frame = (filename, line_no, code.co_name, source_line, None)
+        frame_cache[key] = frame
+        return frame
+
     def get_stack_trace(
         self,
         *,
         excluded_modules: Sequence[str] | None = None,
         include_locals: bool = False,
+        resolve_source: bool = True,
         skip: int = 0,
     ):
         trace = []
+        frame_cache = _get_frame_cache(excluded_modules, resolve_source=resolve_source)
         skip += 1  # Skip the frame for this method.
         for frame in _stack_frames(skip=skip):
-            if _is_excluded_frame(frame, excluded_modules):
+            processed_frame = self.get_frame(
+                frame.f_code,
+                frame.f_lineno,
+                frame.f_globals,
+                frame_cache,
+                excluded_modules,
+                resolve_source=resolve_source,
+            )
+            if processed_frame is None:
                 continue
-
-            filename, is_source = self.get_source_file(frame)
-
-            line_no = frame.f_lineno
-            func_name = frame.f_code.co_name
-
-            if is_source:
-                module = inspect.getmodule(frame, filename)
-                module_globals = module.__dict__ if module is not None else None
-                source_line = linecache.getline(
-                    filename, line_no, module_globals
-                ).strip()
-            else:
-                source_line = ""
-
             if include_locals:
                 frame_locals = self.pretty_printer.pformat(frame.f_locals)
-            else:
-                frame_locals = None
+                processed_frame = (*processed_frame[:4], frame_locals)
+            trace.append(processed_frame)
+        trace.reverse()
+        return trace
 
-            trace.append((filename, line_no, func_name, source_line, frame_locals))
+    def get_stack_trace_from_raw(
+        self,
+        raw_stack: list[tuple[Any, int, dict[str, Any], str | None]],
+        *,
+        excluded_modules: Sequence[str] | None = None,
+        resolve_source: bool = True,
+    ):
+        trace = []
+        frame_cache = _get_frame_cache(excluded_modules, resolve_source=resolve_source)
+        for code, line_no, module_globals, frame_locals in raw_stack:
+            processed_frame = self.get_frame(
+                code,
+                line_no,
+                module_globals,
+                frame_cache,
+                excluded_modules,
+                resolve_source=resolve_source,
+            )
+            if processed_frame is None:
+                continue
+            if frame_locals is not None:
+                processed_frame = (*processed_frame[:4], frame_locals)
+            trace.append(processed_frame)
         trace.reverse()
         return trace
 
 
+def _get_stack_trace_recorder() -> _StackTraceRecorder:
+    stack_trace_recorder = getattr(_local_data, "stack_trace_recorder", None)
+    if stack_trace_recorder is None:
+        stack_trace_recorder = _StackTraceRecorder()
+        _local_data.stack_trace_recorder = stack_trace_recorder
+    return stack_trace_recorder
+
+
 def get_stack_trace(*, skip=0):
     """
     Return a processed stack trace for the current call stack.
@@ -363,7 +589,8 @@ def get_stack_trace(*, skip=0):
     Otherwise return a :class:`list` of processed stack frame tuples (file name, line
     number, function name, source line, frame locals) for the current call stack.  The
     first entry in the list will be for the bottom of the stack and the last entry will
-    be for the top of the stack.
+    be for the top of the stack. The source lines are None when the
+    ``LAZY_STACKTRACES`` setting is True, :func:`render_stacktrace` resolves them.
 
     ``skip`` is an :class:`int` indicating the number of stack frames above the frame
     for this function to omit from the stack trace.  The default value of ``0`` means
@@ -374,17 +601,54 @@ def get_stack_trace(*, skip=0):
     if not config["ENABLE_STACKTRACES"]:
         return []
     skip += 1  # Skip the frame for this function.
-    stack_trace_recorder = getattr(_local_data, "stack_trace_recorder", None)
-    if stack_trace_recorder is None:
-        stack_trace_recorder = _StackTraceRecorder()
-        _local_data.stack_trace_recorder = stack_trace_recorder
-    return stack_trace_recorder.get_stack_trace(
+    return _get_stack_trace_recorder().get_stack_trace(
         excluded_modules=config["HIDE_IN_STACKTRACES"],
         include_locals=config["ENABLE_STACKTRACES_LOCALS"],
+        resolve_source=not config["LAZY_STACKTRACES"],
         skip=skip,
     )
 
 
+def get_raw_stack_trace(*, skip=0):
+    """
+    Return the unprocessed frames of the current call stack.
+
+    This is a cheap alternative to :func:`get_stack_trace` for code that
+    records stack traces in a hot path. It returns a :class:`list` of (code
+    object, line number, frame globals, frame locals) tuples, with the top of
+    the stack first, which :func:`get_stack_trace_from_raw` turns into a
+    processed stack trace later. Frame locals are formatted right away when
+    ``ENABLE_STACKTRACES_LOCALS`` is True since they keep changing, and are
+    ``None`` otherwise.
+    """
+    config = dt_settings.get_config()
+    if not config["ENABLE_STACKTRACES"]:
+        return []
+    skip += 1  # Skip the frame for this function.
+    include_locals = config["ENABLE_STACKTRACES_LOCALS"]
+    pretty_printer = _StackTraceRecorder.pretty_printer
+    raw_stack = []
+    for frame in _stack_frames(skip=skip):
+        frame_locals = (
+            pretty_printer.pformat(frame.f_locals) if include_locals else None
+        )
+        raw_stack.append((frame.f_code, frame.f_lineno, frame.f_globals, frame_locals))
+    return raw_stack
+
+
+def get_stack_trace_from_raw(raw_stack):
+    """
+    Return the processed stack trace for a :func:`get_raw_stack_trace` result,
+    in the same format as :func:`get_stack_trace`.
+    """
+    config = dt_settings.get_config()
+    return _get_stack_trace_recorder().get_stack_trace_from_raw(
+        raw_stack,
+        excluded_modules=config["HIDE_IN_STACKTRACES"],
+        resolve_source=not config["LAZY_STACKTRACES"],
+    )
+
+
 def clear_stack_trace_caches():
     if hasattr(_local_data, "stack_trace_recorder"):
         del _local_data.stack_trace_recorder
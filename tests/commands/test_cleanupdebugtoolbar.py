@@ -0,0 +1,24 @@
+import io
+import uuid
+
+from django.core import management
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from debug_toolbar.models import HistoryEntry
+
+
+class CleanupDebugToolbarTestCase(TestCase):
+    @override_settings(DEBUG_TOOLBAR_CONFIG={"RESULTS_CACHE_SIZE": 2})
+    def test_command(self):
+        for _ in range(5):
+            HistoryEntry.objects.create(request_id=uuid.uuid4())
+        newest = list(HistoryEntry.objects.values_list("request_id", flat=True)[:2])
+
+        stdout = io.StringIO()
+        management.call_command("cleanupdebugtoolbar", stdout=stdout)
+
+        self.assertEqual(stdout.getvalue(), "Deleted 3 history entries.\n")
+        self.assertEqual(
+            list(HistoryEntry.objects.values_list("request_id", flat=True)), newest
+        )
@@ -132,6 +132,19 @@ class CachePanelTestCase(BaseTestCase):
         # ensure traces aren't escaped
         self.assertIn('<span class="djdt-path">', content)
 
+    def test_stores_own_frames(self):
+        # Frames interned by another panel of the request.
+        other = ("/server/views.py", 10, "view", "get_users()", None)
+        self.toolbar.frame_table.add([other])
+        cache.cache.get("foo")
+        response = self.panel.process_request(self.request)
+        self.panel.generate_stats(self.request, response)
+
+        stats = self.panel.get_stats()
+        [call] = stats["calls"]
+        self.assertEqual(call["trace"], list(range(len(stats["frames"]))))
+        self.assertNotIn(other, stats["frames"])
+
     def test_generate_server_timing(self):
         self.assertEqual(len(self.panel.calls), 0)
         cache.cache.set("foo", "bar")
@@ -1,5 +1,6 @@
 import asyncio
 import datetime
+import json
 import os
 import unittest
 from unittest.mock import call, patch
@@ -16,11 +17,19 @@ from django.shortcuts import render
 from django.test.utils import override_settings
 from sqlparse.exceptions import SQLParseError
 
+import debug_toolbar.panels.sql.forms as sql_forms
 import debug_toolbar.panels.sql.tracking as sql_tracking
 from debug_toolbar import settings as dt_settings
 from debug_toolbar.models import HistoryEntry
 from debug_toolbar.panels.sql import SQLPanel, tracking
-from debug_toolbar.panels.sql.utils import parse_sql
+from debug_toolbar.panels.sql.utils import (
+    get_duplicate_fingerprint,
+    get_query_fingerprint,
+    parse_postgresql_plan,
+    parse_sql,
+    parse_sqlite_plan,
+    reformat_sql,
+)
 
 try:
     import psycopg
@@ -77,6 +86,7 @@ def patch_tracking_ddt_models():
         tracking.DDT_MODELS = {
             m._meta.db_table for m in apps.get_app_config("debug_toolbar").get_models()
         }
+        tracking._get_table_matcher.cache_clear()
 
 
 class SQLPanelTestCase(BaseTestCase):
@@ -225,6 +235,35 @@ class SQLPanelTestCase(BaseTestCase):
 
         self.assertEqual(len(self.panel._queries), 0)
 
+    @override_settings(
+        DEBUG_TOOLBAR_CONFIG={
+            "SKIP_TOOLBAR_QUERIES": True,
+            "TOOLBAR_STORE_CLASS": "debug_toolbar.store.DatabaseStore",
+        }
+    )
+    def test_toolbar_model_query_skips_processing(self):
+        patch_tracking_ddt_models()
+        with patch.object(sql_tracking, "get_stack_trace") as get_stack_trace:
+            sql_call_toolbar_model()
+        get_stack_trace.assert_not_called()
+        self.assertEqual(len(self.panel._queries), 0)
+
+    def test_is_toolbar_query(self):
+        original = tracking.DDT_MODELS
+        self.addCleanup(tracking._get_table_matcher.cache_clear)
+        self.addCleanup(setattr, tracking, "DDT_MODELS", original)
+        tracking.DDT_MODELS = set()
+        tracking._get_table_matcher.cache_clear()
+        self.assertFalse(tracking.is_toolbar_query('SELECT * FROM "auth_user"'))
+        tracking.add_toolbar_table("auth_user")
+        self.assertTrue(tracking.is_toolbar_query('SELECT * FROM "auth_user"'))
+        self.assertFalse(tracking.is_toolbar_query('SELECT * FROM "auth_group"'))
+        tracking.DDT_MODELS = {"auth_group", "a.b"}
+        tracking._get_table_matcher.cache_clear()
+        self.assertFalse(tracking.is_toolbar_query('SELECT * FROM "auth_user"'))
+        self.assertTrue(tracking.is_toolbar_query('SELECT * FROM "auth_group"'))
+        self.assertFalse(tracking.is_toolbar_query('SELECT * FROM "aXb"'))
+
     @unittest.skipUnless(
         connection.vendor == "postgresql", "Test valid only on PostgreSQL"
     )
@@ -236,6 +275,25 @@ class SQLPanelTestCase(BaseTestCase):
         # ensure query was logged
         self.assertEqual(len(self.panel._queries), 1)
 
+    def test_cursor_wrapper_class_is_cached(self):
+        wrapper_class = sql_tracking.patch_cursor_wrapper_with_mixin(
+            CursorWrapper, sql_tracking.NormalCursorMixin
+        )
+        self.assertIs(
+            sql_tracking.patch_cursor_wrapper_with_mixin(
+                CursorWrapper, sql_tracking.NormalCursorMixin
+            ),
+            wrapper_class,
+        )
+        self.assertIsNot(
+            sql_tracking.patch_cursor_wrapper_with_mixin(
+                CursorWrapper, sql_tracking.ExceptionCursorMixin
+            ),
+            wrapper_class,
+        )
+        with connection.cursor() as cursor1, connection.cursor() as cursor2:
+            self.assertIs(type(cursor1), type(cursor2))
+
     @patch(
         "debug_toolbar.panels.sql.tracking.patch_cursor_wrapper_with_mixin",
         wraps=sql_tracking.patch_cursor_wrapper_with_mixin,
@@ -629,6 +687,25 @@ class SQLPanelTestCase(BaseTestCase):
         self.assertTrue("sql" in query)
         self.assertEqual(query["sql"], 'select "username" from "auth_user"')
 
+    def test_stacktrace_frames_are_interned(self):
+        for user_id in range(3):
+            User.objects.filter(id=user_id).count()
+        User.objects.count()
+
+        response = self.panel.process_request(self.request)
+        self.panel.generate_stats(self.request, response)
+
+        stats = self.panel.get_stats()
+        traces = [query["stacktrace"] for query in stats["queries"]]
+        self.assertEqual(traces[0], traces[1])
+        self.assertEqual(traces[0], traces[2])
+        self.assertNotEqual(traces[0], traces[3])
+        # The queries only differ by the line of their innermost frame.
+        self.assertEqual(traces[0][:-1], traces[3][:-1])
+        self.assertEqual(len(stats["frames"]), len(traces[0]) + 1)
+        self.assertEqual(stats["frames"][traces[0][-1]][2], self._testMethodName)
+        self.assertEqual(self.panel.content.count(self._testMethodName), 4)
+
     def test_disable_stacktraces(self):
         self.assertEqual(len(self.panel._queries), 0)
 
@@ -688,7 +765,8 @@ class SQLPanelTestCase(BaseTestCase):
             self.panel.generate_stats(self.request, response)
             # The content formats the sql and prettifies it
             self.assertTrue(self.panel.content)
-            pretty_sql = self.panel._queries[-1]["sql"]
+            pretty_sql = reformat_sql(self.panel._queries[-1]["sql"], with_toggle=True)
+            self.assertIn(pretty_sql, self.panel.content)
             self.assertEqual(len(self.panel._queries), 1)
 
         # Recreate the panel to reset the queries. Content being a cached_property
@@ -734,9 +812,15 @@ class SQLPanelTestCase(BaseTestCase):
         # The content formats the sql which injects the ellipsis character
         self.assertTrue(self.panel.content)
         self.assertEqual(len(self.panel._queries), 3)
-        self.assertNotIn("\u2022", self.panel._queries[0]["sql"])
-        self.assertNotIn("\u2022", self.panel._queries[1]["sql"])
-        self.assertIn("\u2022", self.panel._queries[2]["sql"])
+        formatted = [
+            reformat_sql(query["sql"], with_toggle=True)
+            for query in self.panel._queries
+        ]
+        self.assertNotIn("\u2022", formatted[0])
+        self.assertNotIn("\u2022", formatted[1])
+        self.assertIn("\u2022", formatted[2])
+        for sql in formatted:
+            self.assertIn(sql, self.panel.content)
 
     def test_top_level_simplification(self):
         """
@@ -764,19 +848,25 @@ class SQLPanelTestCase(BaseTestCase):
             self.assertEqual(len(self.panel._queries), 4)
         else:
             self.assertEqual(len(self.panel._queries), 2)
+        formatted = [
+            reformat_sql(query["sql"], with_toggle=True)
+            for query in self.panel._queries
+        ]
+        for sql in formatted:
+            self.assertIn(sql, self.panel.content)
         # WHERE ... IN SELECT ... queries should have only one elided select list
-        self.assertEqual(self.panel._queries[0]["sql"].count("SELECT"), 4)
-        self.assertEqual(self.panel._queries[0]["sql"].count("\u2022"), 3)
+        self.assertEqual(formatted[0].count("SELECT"), 4)
+        self.assertEqual(formatted[0].count("\u2022"), 3)
         # UNION queries should have two elidid select lists
-        self.assertEqual(self.panel._queries[1]["sql"].count("SELECT"), 4)
-        self.assertEqual(self.panel._queries[1]["sql"].count("\u2022"), 6)
+        self.assertEqual(formatted[1].count("SELECT"), 4)
+        self.assertEqual(formatted[1].count("\u2022"), 6)
         if connection.vendor != "mysql":
             # INTERSECT queries should have two elidid select lists
-            self.assertEqual(self.panel._queries[2]["sql"].count("SELECT"), 4)
-            self.assertEqual(self.panel._queries[2]["sql"].count("\u2022"), 6)
+            self.assertEqual(formatted[2].count("SELECT"), 4)
+            self.assertEqual(formatted[2].count("\u2022"), 6)
             # EXCEPT queries should have two elidid select lists
-            self.assertEqual(self.panel._queries[3]["sql"].count("SELECT"), 4)
-            self.assertEqual(self.panel._queries[3]["sql"].count("\u2022"), 6)
+            self.assertEqual(formatted[3].count("SELECT"), 4)
+            self.assertEqual(formatted[3].count("\u2022"), 6)
 
     @override_settings(
         DEBUG=True,
@@ -822,6 +912,89 @@ class SQLPanelTestCase(BaseTestCase):
         self.assertEqual(template_info["context"][0]["content"].strip(), "{{ users }}")
         self.assertEqual(template_info["context"][0]["highlight"], True)
 
+    @override_settings(DEBUG=True)
+    def test_deferred_capture_matches_immediate(self):
+        def run_queries():
+            list(User.objects.filter(first_name="Foo", is_staff=True))
+            render(self.request, "sql/nested.html", {"users": User.objects.all()})
+
+        for deferred in (False, True):
+            config = {**dt_settings.get_config(), "SQL_DEFERRED_CAPTURE": deferred}
+            with self.settings(DEBUG_TOOLBAR_CONFIG=config):
+                run_queries()
+
+        response = self.panel.process_request(self.request)
+        self.panel.generate_stats(self.request, response)
+
+        self.assertEqual(len(self.panel._queries), 4)
+        immediate, deferred = self.panel._queries[:2], self.panel._queries[2:]
+        keys = (
+            "sql",
+            "raw_sql",
+            "params",
+            "stacktrace",
+            "template_info",
+            "similar_count",
+            "duplicate_count",
+        )
+        for key in keys:
+            self.assertEqual(
+                [query[key] for query in deferred],
+                [query[key] for query in immediate],
+                key,
+            )
+        self.assertIsNotNone(deferred[1]["template_info"])
+        self.assertNotIn("deferred", deferred[0])
+
+    def test_deferred_capture_skips_processing(self):
+        config = {**dt_settings.get_config(), "SQL_DEFERRED_CAPTURE": True}
+        with (
+            self.settings(DEBUG_TOOLBAR_CONFIG=config),
+            patch.object(tracking, "get_stack_trace") as get_stack_trace,
+            patch.object(tracking, "get_template_info") as get_template_info,
+            patch.object(
+                tracking, "get_duplicate_fingerprint"
+            ) as get_duplicate_fingerprint,
+        ):
+            list(User.objects.filter(first_name="Foo"))
+
+        get_stack_trace.assert_not_called()
+        get_template_info.assert_not_called()
+        get_duplicate_fingerprint.assert_not_called()
+        query = self.panel._queries[0]
+        self.assertIsNone(query["duplicate_fingerprint"])
+        self.assertEqual(query["params"], "")
+        self.assertEqual(query["stacktrace"], [])
+        if tracking._has_stateless_last_executed_query(connection):
+            self.assertIsNone(query["sql"])
+
+        tracking.resolve_deferred_query(query)
+        self.assertIn("Foo", query["sql"])
+        self.assertIn("Foo", query["params"])
+        self.assertIn(
+            "test_deferred_capture_skips_processing",
+            [frame[2] for frame in query["stacktrace"]],
+        )
+
+    def test_deferred_capture_falls_back_on_errors(self):
+        config = {**dt_settings.get_config(), "SQL_DEFERRED_CAPTURE": True}
+        with self.settings(DEBUG_TOOLBAR_CONFIG=config):
+            list(User.objects.filter(first_name="Foo"))
+        query = self.panel._queries[0]
+        query["sql"] = None
+
+        with (
+            patch.object(connection.ops, "last_executed_query", side_effect=ValueError),
+            patch.object(tracking, "encode_params", side_effect=ValueError),
+            patch.object(tracking, "get_duplicate_fingerprint", side_effect=ValueError),
+        ):
+            tracking.resolve_deferred_query(query)
+
+        self.assertEqual(query["sql"], query["raw_sql"])
+        self.assertEqual(query["params"], "")
+        self.assertEqual(query["duplicate_fingerprint"], query["djdt_query_id"])
+        self.assertNotIn("deferred", query)
+
     def test_similar_and_duplicate_grouping(self):
         self.assertEqual(len(self.panel._queries), 0)
 
@@ -871,12 +1044,520 @@ class SQLPanelTestCase(BaseTestCase):
         self.assertNotEqual(queries[0]["similar_color"], queries[3]["similar_color"])
         self.assertNotEqual(queries[0]["duplicate_color"], queries[3]["similar_color"])
 
+    def test_similar_grouping_ignores_list_length(self):
+        list(User.objects.filter(id__in=[1, 2]))
+        list(User.objects.filter(id__in=[1, 2, 3]))
+        list(User.objects.filter(id__in=[1, 2, 3]))
+        list(User.objects.filter(id__in=[1]))
+
+        response = self.panel.process_request(self.request)
+        self.panel.generate_stats(self.request, response)
+
+        queries = self.panel._queries
+        self.assertEqual([q.get("similar_count") for q in queries], [4, 4, 4, 4])
+        self.assertEqual(
+            [q.get("duplicate_count") for q in queries], [None, 2, 2, None]
+        )
+
+    def test_query_fingerprints(self):
+        self.assertEqual(
+            get_query_fingerprint('SELECT * FROM "t" WHERE "id" IN (%s, %s)'),
+            get_query_fingerprint('SELECT * FROM "t" WHERE "id" IN (%s,%s,%s)'),
+        )
+        self.assertEqual(
+            get_query_fingerprint('INSERT INTO "t" ("a", "b") VALUES (%s, %s)'),
+            get_query_fingerprint(
+                'INSERT INTO "t" ("a", "b") VALUES (%s, %s), (%s, %s)'
+            ),
+        )
+        self.assertNotEqual(
+            get_query_fingerprint('SELECT * FROM "t" WHERE "id" = %s'),
+            get_query_fingerprint('SELECT * FROM "u" WHERE "id" = %s'),
+        )
+        self.assertEqual(
+            get_duplicate_fingerprint("SELECT %s", [[1], {"a": 1}]),
+            get_duplicate_fingerprint("SELECT %s", [[1], {"a": 1}]),
+        )
+        self.assertNotEqual(
+            get_duplicate_fingerprint("SELECT %s", ["12"]),
+            get_duplicate_fingerprint("SELECT %s", ["1", "2"]),
+        )
+
+    @override_settings(
+        DEBUG_TOOLBAR_CONFIG={
+            "SQL_MAX_RECORDED_QUERIES": 2,
+            "SQL_SLOWEST_RECORDED_QUERIES": 0,
+        }
+    )
+    def test_max_recorded_queries(self):
+        self.panel.enable_instrumentation()
+
+        with patch.object(sql_tracking, "get_stack_trace") as get_stack_trace:
+            User.objects.filter(id=1).count()
+            User.objects.filter(id=1).count()
+            User.objects.filter(id=2).count()
+            User.objects.filter(id__lt=10).count()
+            User.objects.filter(id__lt=20).count()
+            User.objects.filter(id__gt=10, id__lt=20).count()
+        self.assertEqual(get_stack_trace.call_count, 2)
+
+        response = self.panel.process_request(self.request)
+        self.panel.generate_stats(self.request, response)
+
+        stats = self.panel.get_stats()
+        self.assertEqual(len(stats["queries"]), 2)
+        self.assertEqual(stats["summarized_count"], 4)
+        self.assertEqual(stats["sql_time"], self.panel._sql_time)
+        # The aggregates include the summarized queries.
+        _alias, db_info = stats["databases"][0]
+        self.assertEqual(db_info["num_queries"], 6)
+        self.assertEqual(db_info["similar_count"], 5)
+        self.assertEqual(db_info["duplicate_count"], 2)
+        self.assertEqual(stats["queries"][0]["similar_count"], 3)
+        self.assertEqual(stats["queries"][0]["duplicate_count"], 2)
+        self.assertIn("6 queries", self.panel.nav_subtitle)
+        self.assertIn("4 queries were summarized", self.panel.content)
+
+    @override_settings(
+        DEBUG_TOOLBAR_CONFIG={
+            "SQL_MAX_RECORDED_QUERIES": 1,
+            "SQL_QUERY_SAMPLE_RATE": 0.5,
+            "SQL_SLOWEST_RECORDED_QUERIES": 0,
+        }
+    )
+    def test_max_recorded_queries_sample(self):
+        self.panel.enable_instrumentation()
+
+        for user_id in range(6):
+            User.objects.filter(id=user_id).count()
+
+        response = self.panel.process_request(self.request)
+        self.panel.generate_stats(self.request, response)
+
+        stats = self.panel.get_stats()
+        self.assertEqual(
+            [query["params"] for query in stats["queries"]],
+            ["[0]", "[1]", "[3]", "[5]"],
+        )
+        self.assertEqual(stats["summarized_count"], 2)
+
+    def test_max_recorded_queries_sample_rates(self):
+        cases = [
+            (1.0, [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10]),
+            (2, [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10]),
+            (0.4, [0, 1, 4, 6, 9]),
+            (-1, [0]),
+        ]
+        for sample_rate, expected in cases:
+            config = {
+                "SQL_MAX_RECORDED_QUERIES": 1,
+                "SQL_QUERY_SAMPLE_RATE": sample_rate,
+                "SQL_SLOWEST_RECORDED_QUERIES": 0,
+            }
+            with (
+                self.subTest(sample_rate=sample_rate),
+                self.settings(DEBUG_TOOLBAR_CONFIG=config),
+            ):
+                panel = SQLPanel(self.panel.toolbar, self.panel.get_response)
+                sampled = []
+                for position in range(11):
+                    if panel.wants_details(0):
+                        sampled.append(position)
+                    panel.record_summary(
+                        alias="default",
+                        duration=0,
+                        fingerprint="",
+                        duplicate_fingerprint="",
+                    )
+                self.assertEqual(sampled, expected)
+
+    @override_settings(
+        DEBUG_TOOLBAR_CONFIG={
+            "SQL_MAX_RECORDED_QUERIES": 1,
+            "SQL_SLOWEST_RECORDED_QUERIES": 2,
+        }
+    )
+    def test_max_recorded_queries_keeps_slowest(self):
+        self.panel.enable_instrumentation()
+
+        for position, duration in enumerate([1, 5, 2, 7, 3]):
+            fingerprints = {
+                "fingerprint": get_query_fingerprint("SELECT %s"),
+                "duplicate_fingerprint": get_duplicate_fingerprint(
+                    "SELECT %s", [position]
+                ),
+            }
+            if self.panel.wants_details(duration):
+                self.panel.record(
+                    alias="default",
+                    vendor="sqlite",
+                    sql=f"SELECT {position}",
+                    raw_sql="SELECT %s",
+                    params=f"[{position}]",
+                    duration=duration,
+                    stacktrace=[],
+                    **fingerprints,
+                )
+            else:
+                self.panel.record_summary(
+                    alias="default", duration=duration, **fingerprints
+                )
+
+        response = self.panel.process_request(self.request)
+        self.panel.generate_stats(self.request, response)
+
+        stats = self.panel.get_stats()
+        # The first query and the two slowest ones, in execution order.
+        self.assertEqual([query["duration"] for query in stats["queries"]], [1, 5, 7])
+        self.assertEqual(stats["summarized_count"], 2)
+        self.assertEqual(stats["sql_time"], 18)
+        _alias, db_info = stats["databases"][0]
+        self.assertEqual(db_info["num_queries"], 5)
+        self.assertEqual(db_info["similar_count"], 5)
+        self.assertEqual(stats["queries"][0]["similar_count"], 5)
+
+    @override_settings(
+        DEBUG_TOOLBAR_CONFIG={
+            "SQL_MAX_RECORDED_QUERIES": 1,
+            "SQL_SLOWEST_RECORDED_QUERIES": 1,
+        }
+    )
+    def test_max_recorded_queries_counts_deferred_queries(self):
+        self.panel.enable_instrumentation()
+
+        # Every query is slower than the previous one, so each of them
+        # replaces the one kept before it.
+        for position in range(4):
+            self.panel.wants_details(position)
+            self.panel.record(
+                alias="default",
+                vendor="sqlite",
+                sql=f"SELECT {position % 2}",
+                raw_sql="SELECT %s",
+                params="",
+                duration=position,
+                stacktrace=[],
+                fingerprint=None,
+                duplicate_fingerprint=None,
+                deferred=([position % 2], [], None),
+            )
+
+        response = self.panel.process_request(self.request)
+        self.panel.generate_stats(self.request, response)
+
+        stats = self.panel.get_stats()
+        self.assertEqual([query["duration"] for query in stats["queries"]], [0, 3])
+        _alias, db_info = stats["databases"][0]
+        self.assertEqual(db_info["similar_count"], 4)
+        self.assertEqual(db_info["duplicate_count"], 4)
+        self.assertEqual(stats["queries"][1]["duplicate_count"], 2)
+
+    def test_n_plus_one_detection(self):
+        for user_id in range(6):
+            User.objects.filter(id=user_id).count()  # N+1 call site
+        User.objects.filter(id__lt=10).count()
+
+        response = self.panel.process_request(self.request)
+        self.panel.generate_stats(self.request, response)
+
+        [entry] = self.panel.get_stats()["n_plus_one"]
+        self.assertEqual(entry["filename"], __file__)
+        self.assertEqual(entry["count"], 6)
+        self.assertAlmostEqual(
+            entry["duration"],
+            sum(query["duration"] for query in self.panel._queries[:6]),
+        )
+        self.assertLess(entry["saving"], entry["duration"])
+        with open(__file__) as f:
+            line = f.readlines()[entry["lineno"] - 1]
+        self.assertIn("# N+1 call site", line)
+        self.assertIn("N+1 at", self.panel.content)
+
+        alerts_panel = self.toolbar.get_panel_by_id("AlertsPanel")
+        [alert] = alerts_panel.get_stats()["alerts"]
+        self.assertIn(f"N+1 queries at {__file__}:{entry['lineno']}", alert["alert"])
+        self.assertIn("6 queries", alert["alert"])
+
+    @override_settings(DEBUG_TOOLBAR_CONFIG={"SQL_N_PLUS_ONE_THRESHOLD": None})
+    def test_n_plus_one_detection_disabled(self):
+        self.panel.enable_instrumentation()
+        for user_id in range(6):
+            User.objects.filter(id=user_id).count()
+
+        response = self.panel.process_request(self.request)
+        self.panel.generate_stats(self.request, response)
+
+        self.assertEqual(self.panel.get_stats()["n_plus_one"], [])
+        alerts_panel = self.toolbar.get_panel_by_id("AlertsPanel")
+        self.assertEqual(alerts_panel.alerts, [])
+
+    @override_settings(DEBUG_TOOLBAR_CONFIG={"SQL_QUERIES_PER_PAGE": 2})
+    def test_content_renders_first_page(self):
+        for user_id in range(3):
+            User.objects.filter(id=user_id).count()
+
+        response = self.panel.process_request(self.request)
+        self.panel.generate_stats(self.request, response)
+
+        content = self.panel.content
+        self.assertIn('id="sqlMain_1"', content)
+        self.assertNotIn('id="sqlMain_2"', content)
+        self.assertIn('data-page="2"', content)
+        self.assertValidHTML(content)
+
+    def test_filter_queries(self):
+        with transaction.atomic():
+            User.objects.filter(id=1).count()
+        list(User.objects.filter(username="djdt"))
+
+        response = self.panel.process_request(self.request)
+        self.panel.generate_stats(self.request, response)
+        queries = self.panel.get_stats()["queries"]
+
+        def filter_queries(**data):
+            form = self.panel.get_filter_form(
+                {"request_id": self.toolbar.request_id, **data}
+            )
+            self.assertTrue(form.is_valid(), form.errors)
+            return [index for index, _query in form.filter(queries)]
+
+        self.assertEqual(filter_queries(), list(range(len(queries))))
+        self.assertEqual(filter_queries(alias="default"), list(range(len(queries))))
+        self.assertEqual(filter_queries(min_duration=10**6), [])
+        fingerprint = queries[-1]["fingerprint"]
+        self.assertEqual(filter_queries(fingerprint=fingerprint), [len(queries) - 1])
+        self.assertEqual(
+            filter_queries(in_trans="on"),
+            [index for index, query in enumerate(queries) if query.get("in_trans")],
+        )
+
+        form = self.panel.get_filter_form(
+            {"request_id": self.toolbar.request_id, "alias": "missing"}
+        )
+        self.assertFalse(form.is_valid())
+
+    @override_settings(
+        DEBUG_TOOLBAR_CONFIG={
+            "SQL_EXPLAIN_SLOW_QUERIES": True,
+            "SQL_WARNING_THRESHOLD": -1,
+        }
+    )
+    def test_explain_slow_queries(self):
+        User.objects.filter(id=1).count()
+        User.objects.filter(id=2).count()
+        list(User.objects.filter(username="djdt"))
+        # The explained queries aren't recorded.
+        self.panel.disable_instrumentation()
+
+        response = self.panel.process_request(self.request)
+        with patch(
+            "debug_toolbar.panels.sql.forms.explain_query",
+            wraps=sql_forms.explain_query,
+        ) as explain_query:
+            self.panel.generate_stats(self.request, response)
+        # Once per group of similar queries.
+        self.assertEqual(explain_query.call_count, 2)
+
+        queries = self.panel.get_stats()["queries"]
+        self.assertEqual(len(queries), 3)
+        self.assertIs(queries[0]["explain"], queries[1]["explain"])
+        self.assertIn("detail", queries[0]["explain"]["headers"])
+        self.assertNotEqual(queries[0]["explain"], queries[2]["explain"])
+        self.assertIn(">SEARCH auth_user USING", self.panel.content)
+        self.assertIn("Explain slow queries", self.panel.content)
+
+    @override_settings(DEBUG_TOOLBAR_CONFIG={"SQL_WARNING_THRESHOLD": -1})
+    def test_explain_slow_queries_refreshes_content(self):
+        list(User.objects.filter(username="djdt"))
+        self.panel.disable_instrumentation()
+        response = self.panel.process_request(self.request)
+        self.panel.generate_stats(self.request, response)
+        self.assertNotIn('class="djdt-plan"', self.panel.content)
+
+        form = sql_forms.SQLExplainSlowQueriesForm({"request_id": "unused"})
+        form.cleaned_data = {"panel": self.panel}
+        self.assertEqual(len(form.explain()), 1)
+        self.assertIn('class="djdt-plan"', self.panel.content)
+
+    def test_explain_slow_queries_skips_writes(self):
+        User.objects.create(username="djdt")
+        self.panel.disable_instrumentation()
+        response = self.panel.process_request(self.request)
+        self.panel.generate_stats(self.request, response)
+        queries = self.panel.get_stats()["queries"]
+        for query in queries:
+            query["is_slow"] = True
+
+        self.assertEqual(sql_forms.explain_slow_queries(queries), [])
+        self.assertNotIn("explain", queries[0])
+
+    def test_explain_slow_queries_skips_queries_without_fingerprint(self):
+        list(User.objects.filter(username="djdt"))
+        self.panel.disable_instrumentation()
+        response = self.panel.process_request(self.request)
+        self.panel.generate_stats(self.request, response)
+        queries = self.panel.get_stats()["queries"]
+        # The queries stored by older versions don't have a fingerprint.
+        for query in queries:
+            query["is_slow"] = True
+            query["similar_count"] = 2
+            del query["fingerprint"]
+
+        self.assertEqual(sql_forms.explain_slow_queries(queries), [])
+        self.assertNotIn("explain", queries[0])
+        self.panel.record_stats({"queries": queries})
+        self.assertIn("2 similar queries.", self.panel.content)
+        self.assertNotIn("data-fingerprint", self.panel.content)
+
+    @unittest.skipUnless(connection.vendor == "sqlite", "Test valid only on SQLite")
+    def test_parse_sqlite_plan(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "EXPLAIN QUERY PLAN SELECT * FROM auth_user WHERE id IN "
+                "(SELECT user_id FROM auth_user_groups WHERE group_id = %s)",
+                [1],
+            )
+            nodes = parse_sqlite_plan(cursor.fetchall())
+            cursor.execute(
+                "EXPLAIN QUERY PLAN SELECT * FROM auth_user WHERE last_login < %s",
+                [datetime.datetime(2000, 1, 1)],
+            )
+            [scan] = parse_sqlite_plan(cursor.fetchall())
+
+        self.assertEqual(nodes[0]["depth"], 0)
+        # The subquery's nodes are nested under the subquery.
+        [subquery] = [node for node in nodes if "auth_user_groups" in node["label"]]
+        self.assertEqual(subquery["depth"], 1)
+        self.assertEqual(subquery["warnings"], [])
+        self.assertTrue(scan["label"].startswith("SCAN"))
+        self.assertEqual(scan["warnings"], ["seq_scan"])
+
+    def test_parse_sqlite_plan_tree(self):
+        nodes = parse_sqlite_plan(
+            [
+                (2, 0, 0, "SCAN t"),
+                (5, 0, 0, "CORRELATED SCALAR SUBQUERY 1"),
+                (9, 5, 0, "SEARCH u USING INDEX u_t_id (t_id=?)"),
+                (20, 0, 0, "USE TEMP B-TREE FOR ORDER BY"),
+                (24, 0, 0, "SCAN CONSTANT ROW"),
+            ]
+        )
+        self.assertEqual([node["depth"] for node in nodes], [0, 0, 1, 0, 0])
+        self.assertEqual(
+            [node["warnings"] for node in nodes], [["seq_scan"], [], [], [], []]
+        )
+
+    def test_parse_postgresql_plan(self):
+        plan = [
+            {
+                "Plan": {
+                    "Node Type": "Hash Join",
+                    "Plan Rows": 10,
+                    "Actual Rows": 500,
+                    "Actual Loops": 1,
+                    "Actual Total Time": 12.5,
+                    "Plans": [
+                        {
+                            "Node Type": "Seq Scan",
+                            "Relation Name": "auth_user",
+                            "Plan Rows": 5000,
+                            "Actual Rows": 4000,
+                            "Rows Removed by Filter": 1000,
+                            "Actual Loops": 1,
+                            "Actual Total Time": 8.0,
+                        },
+                        {
+                            "Node Type": "Hash",
+                            "Plan Rows": 10,
+                            "Actual Rows": 10,
+                            "Actual Loops": 2,
+                            "Actual Total Time": 0.5,
+                            "Plans": [
+                                {
+                                    "Node Type": "Index Scan",
+                                    "Relation Name": "auth_group",
+                                    "Index Name": "auth_group_pkey",
+                                    "Plan Rows": 10,
+                                    "Actual Rows": 10,
+                                    "Actual Loops": 2,
+                                    "Actual Total Time": 0.25,
+                                }
+                            ],
+                        },
+                    ],
+                },
+                "Planning Time": 0.1,
+                "Execution Time": 12.6,
+            }
+        ]
+        for value in (plan, json.dumps(plan)):
+            with self.subTest(value=type(value)):
+                nodes = parse_postgresql_plan([(value,)])
+                self.assertEqual(
+                    [(node["depth"], node["label"]) for node in nodes],
+                    [
+                        (0, "Hash Join"),
+                        (1, "Seq Scan on auth_user"),
+                        (1, "Hash"),
+                        (2, "Index Scan on auth_group using auth_group_pkey"),
+                    ],
+                )
+                self.assertEqual(
+                    [node["warnings"] for node in nodes],
+                    [["estimate"], ["seq_scan"], [], []],
+                )
+                self.assertEqual(nodes[3]["time"], 0.5)
+                self.assertEqual(nodes[3]["loops"], 2)
+                self.assertEqual(nodes[1]["estimated_rows"], 5000)
+                self.assertEqual(nodes[1]["actual_rows"], 4000)
+
     def test_explain_with_union(self):
         list(User.objects.filter(id__lt=20).union(User.objects.filter(id__gt=10)))
         response = self.panel.process_request(self.request)
         self.panel.generate_stats(self.request, response)
         self.assertIn("Expl", self.panel.content)
 
+    def test_reformat_sql_shares_formatting_of_similar_queries(self):
+        parse_sql.cache_clear()
+        queries = [
+            'SELECT "auth_user"."id" FROM "auth_user" '
+            f'WHERE ("auth_user"."username" = \'<{name}>\' '
+            f'AND "auth_user"."id" > {user_id}) LIMIT 21'
+            for name, user_id in (("alice", 1), ("bob", 2), ("it''s", -3))
+        ]
+        for sql in queries:
+            with self.subTest(sql=sql):
+                expected = (
+                    '<span class="djDebugCollapsed djdt-hidden">'
+                    f"{parse_sql(sql)}</span>"
+                    '<span class="djDebugUncollapsed">'
+                    f"{parse_sql(sql, simplify=True)}</span>"
+                )
+                parse_sql.cache_clear()
+                self.assertEqual(reformat_sql(sql, with_toggle=True), expected)
+        parse_sql.cache_clear()
+        for sql in queries:
+            reformat_sql(sql)
+        # The queries are formatted once, with their literals replaced.
+        self.assertEqual(parse_sql.cache_info().misses, 1)
+        parse_sql.cache_clear()
+
+    def test_reformat_sql_numbers(self):
+        queries = [
+            "SELECT 1e10, 2E-3, 3 FROM test WHERE a = 1.5 AND b = -2",
+            "SELECT a - 1 AS b, -1, +2, .5, 5. FROM test WHERE c > 1e-5",
+            "UPDATE test SET a = 1, b = 2.5e2 WHERE id IN (3, 4)",
+        ]
+        for prettify in (True, False):
+            config = {"PRETTIFY_SQL": prettify}
+            with self.settings(DEBUG_TOOLBAR_CONFIG=config):
+                for sql in queries:
+                    with self.subTest(sql=sql, prettify=prettify):
+                        expected = parse_sql(sql)
+                        parse_sql.cache_clear()
+                        self.assertEqual(reformat_sql(sql), expected)
+        parse_sql.cache_clear()
+
     @override_settings(DEBUG_TOOLBAR_CONFIG={"PRETTIFY_SQL": True})
     def test_sql_parse_error_graceful_degradation(self):
         """
@@ -314,3 +314,14 @@ class ChecksTestCase(SimpleTestCase):
         errors = run_checks()
         self.assertEqual(len(errors), 1)
         self.assertEqual(errors[0].id, "debug_toolbar.W008")
+
+    @override_settings(
+        DEBUG_TOOLBAR_CONFIG={
+            "SQL_QUERY_SAMPLE_RATE": 2,
+            "IS_RUNNING_TESTS": False,
+        }
+    )
+    def test_sql_query_sample_rate_out_of_range(self):
+        errors = run_checks()
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(errors[0].id, "debug_toolbar.W009")
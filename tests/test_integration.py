@@ -455,6 +455,37 @@ class DebugToolbarIntegrationTestCase(IntegrationTestCase):
             )
             self.assertEqual(response.status_code, 404)
 
+    def test_sql_select_loads_query_chunk(self):
+        self.client.get("/execute_sql/")
+        request_id = list(get_store().request_ids())[-1]
+        toolbar = DebugToolbar.fetch(request_id, SQLPanel.panel_id)
+        queries = toolbar.get_panel_by_id(SQLPanel.panel_id).get_stats()["queries"]
+        query_index = len(queries) - 1
+        djdt_query_id = queries[query_index]["djdt_query_id"]
+
+        records = get_store().panel(
+            request_id, SQLPanel.get_query_chunk_key(query_index)
+        )
+        self.assertEqual(records[djdt_query_id]["sql"], queries[query_index]["sql"])
+        # The chunks aren't loaded with the panels' stats.
+        panels = dict(get_store().panels(request_id))
+        self.assertIn(SQLPanel.panel_id, panels)
+        self.assertNotIn(SQLPanel.get_query_chunk_key(query_index), panels)
+
+        data = {
+            "signed": SignedDataForm.sign(
+                {
+                    "request_id": request_id,
+                    "djdt_query_id": djdt_query_id,
+                    "query_index": query_index,
+                }
+            )
+        }
+        with patch("debug_toolbar.panels.sql.forms._fetch_sql_panel") as fetch:
+            response = self.client.post("/__debug__/sql_select/", data)
+        self.assertEqual(response.status_code, 200)
+        fetch.assert_not_called()
+
     def test_sql_explain_checks_show_toolbar(self):
         self.client.get("/execute_sql/")
         request_ids = list(get_store().request_ids())
@@ -487,6 +518,44 @@ class DebugToolbarIntegrationTestCase(IntegrationTestCase):
             )
             self.assertEqual(response.status_code, 404)
 
+    @override_settings(DEBUG_TOOLBAR_CONFIG={"SQL_WARNING_THRESHOLD": -1})
+    def test_sql_explain_slow(self):
+        self.client.get("/execute_sql/")
+        request_id = list(get_store().request_ids())[-1]
+
+        url = "/__debug__/sql_explain_slow/"
+        data = {"signed": SignedDataForm.sign({"request_id": request_id})}
+
+        response = self.client.post(url, data)
+        self.assertContains(response, "Slow queries explained")
+        toolbar = DebugToolbar.fetch(request_id, SQLPanel.panel_id)
+        panel = toolbar.get_panel_by_id(SQLPanel.panel_id)
+        query = panel.get_stats()["queries"][-1]
+        self.assertEqual(query["explain"]["headers"][-1], "detail")
+        with self.settings(INTERNAL_IPS=[]):
+            response = self.client.post(url, data)
+            self.assertEqual(response.status_code, 404)
+
+    def test_sql_queries(self):
+        self.client.get("/execute_sql/")
+        request_id = list(get_store().request_ids())[-1]
+        toolbar = DebugToolbar.fetch(request_id, SQLPanel.panel_id)
+        queries = toolbar.get_panel_by_id(SQLPanel.panel_id).get_stats()["queries"]
+        index = len(queries) - 1
+
+        url = "/__debug__/sql_queries/"
+        data = {"request_id": request_id, "fingerprint": queries[index]["fingerprint"]}
+        response = self.client.get(url, data)
+        self.assertEqual(response.status_code, 200)
+        content = response.json()["content"]
+        self.assertIn(f'id="sqlMain_{index}"', content)
+
+        response = self.client.get(url, {**data, "min_duration": "-1"})
+        self.assertEqual(response.status_code, 400)
+        with self.settings(INTERNAL_IPS=[]):
+            response = self.client.get(url, data)
+            self.assertEqual(response.status_code, 404)
+
     @unittest.skipUnless(
         connection.vendor == "postgresql", "Test valid only on PostgreSQL"
     )
@@ -237,6 +237,35 @@ class DebugToolbarIntegrationTestCase(IntegrationTestCase):
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, "djDebug")
 
+    @override_settings(
+        DEBUG_TOOLBAR_CONFIG={
+            "SQL_EXPLAIN_SLOW_QUERIES": True,
+            "SQL_WARNING_THRESHOLD": -1,
+        }
+    )
+    async def test_explain_slow_queries_in_async_mode(self):
+        response = await self.async_client.get("/async_execute_sql/")
+        self.assertEqual(response.status_code, 200)
+        request_id = list(get_store().request_ids())[-1]
+        toolbar = DebugToolbar.fetch(request_id, SQLPanel.panel_id)
+        queries = toolbar.get_panel_by_id(SQLPanel.panel_id).get_stats()["queries"]
+        self.assertTrue(queries)
+        self.assertTrue(all(query["is_slow"] for query in queries))
+        # Explaining would need a cursor on the event loop, so it's left to
+        # the "Explain slow queries" button.
+        self.assertFalse(any("explain" in query for query in queries))
+
+    @override_settings(DEBUG_TOOLBAR_CONFIG={"SQL_DEFERRED_CAPTURE": True})
+    async def test_deferred_capture_in_async_mode(self):
+        response = await self.async_client.get("/async_execute_sql/")
+        self.assertEqual(response.status_code, 200)
+        request_id = list(get_store().request_ids())[-1]
+        toolbar = DebugToolbar.fetch(request_id, SQLPanel.panel_id)
+        queries = toolbar.get_panel_by_id(SQLPanel.panel_id).get_stats()["queries"]
+        query = next(query for query in queries if query["params"] != "[]")
+        self.assertIn("%s", query["raw_sql"])
+        self.assertNotIn("%s", query["sql"])
+
     @override_settings(DEFAULT_CHARSET="iso-8859-1")
     async def test_non_utf8_charset(self):
         response = await self.async_client.get("/regular/ASCII/")
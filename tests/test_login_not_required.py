@@ -22,7 +22,9 @@ class LoginNotRequiredTestCase(SimpleTestCase):
             "history_refresh",
             "sql_select",
             "sql_explain",
+            "sql_explain_slow",
             "sql_profile",
+            "sql_queries",
             "template_source",
         ):
             with self.subTest(uri=uri):
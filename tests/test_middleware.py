@@ -6,6 +6,7 @@ from django.http import HttpResponse
 from django.test import AsyncRequestFactory, RequestFactory, TestCase, override_settings
 
 from debug_toolbar.middleware import DebugToolbarMiddleware
+from debug_toolbar.store import MemoryStore
 
 if sys.version_info >= (3, 12):
     from inspect import iscoroutinefunction
@@ -46,6 +47,28 @@ class MiddlewareSyncAsyncCompatibilityTestCase(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn(b"djdt", response.content)
 
+    @override_settings(DEBUG=True)
+    def test_panel_stats_saved_in_bulk(self):
+        """
+        test middleware writes the panels' stats to the store in one call
+        """
+        request = self.factory.get("/")
+        middleware = DebugToolbarMiddleware(
+            lambda x: HttpResponse("<html><body>Test app</body></html>")
+        )
+
+        with (
+            patch.object(MemoryStore, "save_panel") as save_panel,
+            patch.object(MemoryStore, "save_panels") as save_panels,
+        ):
+            middleware(request)
+
+        save_panel.assert_not_called()
+        save_panels.assert_called_once()
+        _request_id, panels = save_panels.call_args.args
+        self.assertIn("RequestPanel", panels)
+        self.assertIn("SQLPanel", panels)
+
     @override_settings(DEBUG=True)
     async def test_async_mode(self):
         """
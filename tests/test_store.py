@@ -1,15 +1,27 @@
+import datetime
+import threading
+import unittest
 import uuid
+from unittest.mock import patch
 
+from django.core.exceptions import ImproperlyConfigured
 from django.core.management import call_command
 from django.db import connection
 from django.http import HttpResponse
 from django.test import RequestFactory, TestCase
 from django.test.utils import CaptureQueriesContext, override_settings
 from django.utils.safestring import SafeData, mark_safe
+from django.utils.translation import gettext_lazy
 
-from debug_toolbar import store
+from debug_toolbar import settings as dt_settings, store
+from debug_toolbar.models import HistoryEntry
 from debug_toolbar.toolbar import DebugToolbar
 
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
 
 class SerializationTestCase(TestCase):
     def test_serialize(self):
@@ -36,6 +48,187 @@ class SerializationTestCase(TestCase):
             {"hello": {"foo": "bar"}},
         )
 
+    def test_deserialize_untagged_json_with_msgpack_serializer(self):
+        with self.settings(
+            DEBUG_TOOLBAR_CONFIG={
+                "TOOLBAR_SERIALIZER": "debug_toolbar.store.MsgpackSerializer"
+            }
+        ):
+            self.assertEqual(
+                store.deserialize('{"hello": {"foo": "bar"}}'),
+                {"hello": {"foo": "bar"}},
+            )
+
+
+class SerializerTestsMixin:
+    """
+    Mixin class with tests that apply to all serializers.
+    Subclasses must set serializer to the dotted path of the serializer class.
+    """
+
+    serializer = None
+
+    def setUp(self):
+        super().setUp()
+        settings_override = self.settings(
+            DEBUG_TOOLBAR_CONFIG={"TOOLBAR_SERIALIZER": self.serializer}
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_round_trip(self):
+        data = {
+            "hello": {"foo": "bar"},
+            "list": [1, 2.5, None, True],
+            "tuple": ("a", "b"),
+            "time": datetime.datetime(2017, 12, 22, 16, 7, 1, 123456),
+        }
+        self.assertEqual(
+            store.deserialize(store.serialize(data)),
+            {
+                "hello": {"foo": "bar"},
+                "list": [1, 2.5, None, True],
+                "tuple": ["a", "b"],
+                "time": "2017-12-22T16:07:01.123",
+            },
+        )
+
+    def test_force_str_fallback(self):
+        data = {"hello": {"foo": b"bar", "set": {1}, "lazy": gettext_lazy("Yes")}}
+        self.assertEqual(
+            store.deserialize(store.serialize(data)),
+            {"hello": {"foo": "bar", "set": "{1}", "lazy": "Yes"}},
+        )
+
+    def test_deserialize_json(self):
+        self.assertEqual(
+            store.deserialize('{"hello": {"foo": "bar"}}'),
+            {"hello": {"foo": "bar"}},
+        )
+
+    def test_store_round_trip(self):
+        store.MemoryStore.save_panel("foo", "foo.panel", {"a": [1, 2]})
+        self.addCleanup(store.MemoryStore.clear)
+        self.assertEqual(store.MemoryStore.panel("foo", "foo.panel"), {"a": [1, 2]})
+
+
+class JSONSerializerTestCase(SerializerTestsMixin, TestCase):
+    serializer = "debug_toolbar.store.JSONSerializer"
+
+
+@unittest.skipIf(store.orjson is None, "orjson isn't installed")
+class OrjsonSerializerTestCase(SerializerTestsMixin, TestCase):
+    serializer = "debug_toolbar.store.OrjsonSerializer"
+
+    def test_serialize_unexpected(self):
+        self.assertEqual(
+            store.serialize({"hello": {str: "this-is-a-string", "foo": "bar"}}),
+            '{"hello": {"foo": "bar"}}',
+        )
+
+    def test_serialize_falls_back_to_json(self):
+        self.assertEqual(
+            store.serialize({"big": 2**70}), '{"big": 1180591620717411303424}'
+        )
+
+
+@unittest.skipIf(store.msgpack is None, "msgpack isn't installed")
+class MsgpackSerializerTestCase(SerializerTestsMixin, TestCase):
+    serializer = "debug_toolbar.store.MsgpackSerializer"
+
+    def test_serialize_is_tagged(self):
+        self.assertTrue(store.serialize({"a": 1}).startswith("\x01"))
+
+    def test_serialize_falls_back_to_json(self):
+        with patch.object(store.msgpack, "packb", side_effect=TypeError):
+            self.assertEqual(store.serialize({"a": 1}), '{"a": 1}')
+
+
+class CompressorTestsMixin:
+    """
+    Mixin class with tests that apply to all compressors.
+    Subclasses must set compressor to the dotted path of the compressor class.
+    """
+
+    compressor = None
+
+    def setUp(self):
+        super().setUp()
+        store.compression_stats.reset()
+        settings_override = self.settings(
+            DEBUG_TOOLBAR_CONFIG={
+                "TOOLBAR_COMPRESSOR": self.compressor,
+                "TOOLBAR_COMPRESSION_THRESHOLD": 100,
+            }
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_compress_above_threshold(self):
+        data = {"queries": ["SELECT * FROM auth_user"] * 100}
+        serialized = store.serialize(data)
+        self.assertLess(len(serialized), len(store.JSONSerializer.dumps(data)))
+        self.assertEqual(store.deserialize(serialized), data)
+        stats = store.compression_stats.as_dict()
+        self.assertEqual(stats["compressed"], 1)
+        self.assertEqual(stats["skipped"], 0)
+        self.assertEqual(stats["compressed_bytes"], len(serialized))
+        self.assertGreater(stats["ratio"], 1)
+
+    def test_skip_below_threshold(self):
+        self.assertEqual(store.serialize({"a": 1}), '{"a": 1}')
+        self.assertEqual(store.compression_stats.as_dict()["skipped"], 1)
+
+    def test_deserialize_without_compressor(self):
+        data = {"queries": ["SELECT * FROM auth_user"] * 100}
+        serialized = store.serialize(data)
+        with self.settings(DEBUG_TOOLBAR_CONFIG={}):
+            self.assertEqual(store.deserialize(serialized), data)
+
+
+class ZlibCompressorTestCase(CompressorTestsMixin, TestCase):
+    compressor = "debug_toolbar.store.ZlibCompressor"
+
+
+@unittest.skipIf(store.lz4 is None, "lz4 isn't installed")
+class LZ4CompressorTestCase(CompressorTestsMixin, TestCase):
+    compressor = "debug_toolbar.store.LZ4Compressor"
+
+
+@unittest.skipIf(store.zstandard is None, "zstandard isn't installed")
+class ZstdCompressorTestCase(CompressorTestsMixin, TestCase):
+    compressor = "debug_toolbar.store.ZstdCompressor"
+
+
+class MissingPackageTestCase(TestCase):
+    def test_orjson_serializer(self):
+        with patch.object(store, "orjson", None):
+            with self.assertRaises(ImproperlyConfigured):
+                store.OrjsonSerializer.dumps({"a": 1})
+            with self.assertRaises(ImproperlyConfigured):
+                store.OrjsonSerializer.loads('{"a": 1}')
+
+    def test_msgpack_serializer(self):
+        with patch.object(store, "msgpack", None):
+            with self.assertRaises(ImproperlyConfigured):
+                store.MsgpackSerializer.dumps({"a": 1})
+            with self.assertRaises(ImproperlyConfigured):
+                store.MsgpackSerializer.loads("\x01gQ==")
+
+    def test_lz4_compressor(self):
+        with patch.object(store, "lz4", None):
+            with self.assertRaises(ImproperlyConfigured):
+                store.LZ4Compressor.compress(b"data")
+            with self.assertRaises(ImproperlyConfigured):
+                store.LZ4Compressor.decompress(b"data")
+
+    def test_zstd_compressor(self):
+        with patch.object(store, "zstandard", None):
+            with self.assertRaises(ImproperlyConfigured):
+                store.ZstdCompressor.compress(b"data")
+            with self.assertRaises(ImproperlyConfigured):
+                store.ZstdCompressor.decompress(b"data")
+
 
 class BaseStoreTestCase(TestCase):
     def test_methods_are_not_implemented(self):
@@ -43,7 +236,7 @@ class BaseStoreTestCase(TestCase):
         methods = [
             member for member in vars(store.BaseStore) if not member.startswith("_")
         ]
-        self.assertEqual(len(methods), 7)
+        self.assertEqual(len(methods), 8)
         with self.assertRaises(NotImplementedError):
             store.BaseStore.request_ids()
         with self.assertRaises(NotImplementedError):
@@ -56,6 +249,8 @@ class BaseStoreTestCase(TestCase):
             store.BaseStore.delete("")
         with self.assertRaises(NotImplementedError):
             store.BaseStore.save_panel("", "", None)
+        with self.assertRaises(NotImplementedError):
+            store.BaseStore.save_panels("", {"": None})
         with self.assertRaises(NotImplementedError):
             store.BaseStore.panel("", "")
 
@@ -127,6 +322,29 @@ class CommonStoreTestsMixin:
         self.assertTrue(self.store.exists(bar_id))
         self.assertEqual(self.store.panel(bar_id, "bar.panel"), {"a": 1})
 
+    def test_save_panels(self):
+        bar_id = self._get_request_id("bar")
+        self.store.save_panel(bar_id, "panel1", {"a": 1})
+        self.store.save_panels(bar_id, {"panel2": {"b": 2}, "panel3": {"c": 3}})
+        self.assertTrue(self.store.exists(bar_id))
+        self.assertEqual(self.store.panel(bar_id, "panel1"), {"a": 1})
+        self.assertEqual(self.store.panel(bar_id, "panel2"), {"b": 2})
+        self.assertEqual(self.store.panel(bar_id, "panel3"), {"c": 3})
+
+    def test_save_panel_compressed(self):
+        bar_id = self._get_request_id("bar")
+        data = {"queries": ["SELECT * FROM auth_user"] * 100}
+        with self.settings(
+            DEBUG_TOOLBAR_CONFIG={
+                **dt_settings.get_config(),
+                "TOOLBAR_COMPRESSOR": "debug_toolbar.store.ZlibCompressor",
+                "TOOLBAR_COMPRESSION_THRESHOLD": 100,
+            }
+        ):
+            self.store.save_panel(bar_id, "bar.panel", data)
+            self.assertEqual(self.store.panel(bar_id, "bar.panel"), data)
+            self.assertEqual(dict(self.store.panels(bar_id)), {"bar.panel": data})
+
     def test_panel(self):
         missing_id = self._get_request_id("missing")
         bar_id = self._get_request_id("bar")
@@ -143,13 +361,93 @@ class CommonStoreTestsMixin:
         self.assertEqual(panels["panel1"], {"a": 1})
         self.assertEqual(panels["panel2"], {"b": 2})
 
+    def test_panels_skips_records(self):
+        bar_id = self._get_request_id("bar")
+        record_key = store.RECORD_KEY_SEPARATOR.join(["panel1", "records", "0"])
+        self.store.save_panel(bar_id, "panel1", {"a": 1})
+        self.store.save_panel(bar_id, record_key, {"b": 2})
+        self.assertEqual(dict(self.store.panels(bar_id)), {"panel1": {"a": 1}})
+        self.assertEqual(self.store.panel(bar_id, record_key), {"b": 2})
+
     def test_panels_nonexistent_request(self):
         missing_id = self._get_request_id("missing")
         panels = dict(self.store.panels(missing_id))
         self.assertEqual(panels, {})
 
 
-class MemoryStoreTestCase(CommonStoreTestsMixin, TestCase):
+class MaxBytesStoreTestsMixin:
+    """
+    Mixin class with RESULTS_CACHE_MAX_BYTES tests for the stores that
+    support it. Subclasses must set self.store to the store class.
+    """
+
+    def _max_bytes_config(self, max_bytes):
+        return {**dt_settings.get_config(), "RESULTS_CACHE_MAX_BYTES": max_bytes}
+
+    def test_usage(self):
+        self.store.save_panels("foo", {"a": "x" * 10, "b": "y" * 20})
+        usage = self.store.usage()
+        self.assertEqual(usage["requests"], 1)
+        self.assertEqual(
+            usage["bytes"],
+            len(store.serialize("x" * 10)) + len(store.serialize("y" * 20)),
+        )
+        self.assertIsNone(usage["max_bytes"])
+
+        # Overwriting a panel replaces its size rather than adding to it.
+        self.store.save_panel("foo", "a", "x")
+        self.assertEqual(
+            self.store.usage()["bytes"],
+            len(store.serialize("x")) + len(store.serialize("y" * 20)),
+        )
+
+        self.store.delete("foo")
+        self.assertEqual(self.store.usage()["bytes"], 0)
+
+    def test_max_bytes_evicts_oldest(self):
+        size = len(store.serialize("x" * 100))
+        evictions = self.store.usage()["evictions"]
+        with self.settings(DEBUG_TOOLBAR_CONFIG=self._max_bytes_config(size * 2)):
+            for request_id in ("foo", "bar", "baz"):
+                self.store.save_panel(request_id, "panel", "x" * 100)
+            usage = self.store.usage()
+        self.assertEqual(list(self.store.request_ids()), ["bar", "baz"])
+        self.assertEqual(usage["bytes"], size * 2)
+        self.assertEqual(usage["max_bytes"], size * 2)
+        self.assertEqual(usage["evictions"], evictions + 1)
+        self.assertFalse(self.store.exists("foo"))
+        self.assertEqual(self.store.panel("foo", "panel"), {})
+
+    def test_max_bytes_keeps_request_being_saved(self):
+        with self.settings(DEBUG_TOOLBAR_CONFIG=self._max_bytes_config(10)):
+            self.store.save_panel("foo", "panel", "x" * 100)
+            self.store.save_panel("bar", "panel", "x" * 100)
+        self.assertEqual(list(self.store.request_ids()), ["bar"])
+        self.assertEqual(self.store.panel("bar", "panel"), "x" * 100)
+
+    def test_max_bytes_count_limit_still_applies(self):
+        config = {**self._max_bytes_config(10**6), "RESULTS_CACHE_SIZE": 1}
+        with self.settings(DEBUG_TOOLBAR_CONFIG=config):
+            self.store.save_panel("foo", "panel", "x")
+            self.store.save_panel("bar", "panel", "x")
+        self.assertEqual(list(self.store.request_ids()), ["bar"])
+        self.assertEqual(self.store.usage()["bytes"], len(store.serialize("x")))
+
+    @unittest.skipIf(store.orjson is None, "orjson isn't installed")
+    def test_usage_counts_encoded_bytes(self):
+        config = {
+            **dt_settings.get_config(),
+            "TOOLBAR_SERIALIZER": "debug_toolbar.store.OrjsonSerializer",
+        }
+        with self.settings(DEBUG_TOOLBAR_CONFIG=config):
+            # orjson doesn't escape non-ASCII characters.
+            self.store.save_panel("foo", "panel", "é" * 10)
+            self.assertEqual(
+                self.store.usage()["bytes"], len(store.serialize("é" * 10)) + 10
+            )
+
+
+class MemoryStoreTestCase(CommonStoreTestsMixin, MaxBytesStoreTestsMixin, TestCase):
     @classmethod
     def setUpTestData(cls) -> None:
         cls.store = store.MemoryStore
@@ -157,6 +455,28 @@ class MemoryStoreTestCase(CommonStoreTestsMixin, TestCase):
     def tearDown(self) -> None:
         self.store.clear()
 
+    def test_max_bytes_without_cache_size(self):
+        config = {
+            **dt_settings.get_config(),
+            "RESULTS_CACHE_SIZE": 0,
+            "RESULTS_CACHE_MAX_BYTES": len(store.serialize("x" * 100)),
+        }
+        with self.settings(DEBUG_TOOLBAR_CONFIG=config):
+            self.store.save_panel("foo", "panel", "x" * 100)
+            self.store.save_panels("bar", {"panel": "x" * 100})
+            usage = self.store.usage()
+        self.assertEqual(list(self.store.request_ids()), ["bar"])
+        self.assertEqual(usage["requests"], 1)
+        self.assertEqual(usage["bytes"], len(store.serialize("x" * 100)))
+
+    def test_set_without_cache_size(self):
+        config = {**dt_settings.get_config(), "RESULTS_CACHE_SIZE": 0}
+        with self.settings(DEBUG_TOOLBAR_CONFIG=config):
+            for request_id in ("foo", "bar"):
+                self.store.save_panel(request_id, "panel", request_id)
+        self.assertEqual(list(self.store.request_ids()), ["foo", "bar"])
+        self.assertEqual(self.store.panel("foo", "panel"), "foo")
+
     def test_serialize_safestring(self):
         before = {"string": mark_safe("safe")}
 
@@ -169,6 +489,96 @@ class MemoryStoreTestCase(CommonStoreTestsMixin, TestCase):
         self.assertTrue(type(after["string"]) is str)
         self.assertFalse(isinstance(after["string"], SafeData))
 
+    def test_set_evicts_oldest(self):
+        with self.settings(DEBUG_TOOLBAR_CONFIG={"RESULTS_CACHE_SIZE": 2}):
+            for request_id in ("foo", "bar", "foo", "baz"):
+                self.store.set(request_id)
+        self.assertEqual(list(self.store.request_ids()), ["bar", "baz"])
+
+    def test_concurrent_save_panel(self):
+        def save(thread_index):
+            for i in range(50):
+                self.store.save_panel(f"{thread_index}-{i}", "panel", {"i": i})
+
+        with self.settings(DEBUG_TOOLBAR_CONFIG={"RESULTS_CACHE_SIZE": 100}):
+            threads = [threading.Thread(target=save, args=(n,)) for n in range(32)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        request_ids = list(self.store.request_ids())
+        self.assertEqual(len(request_ids), 100)
+        self.assertEqual(len(set(request_ids)), 100)
+        for request_id in request_ids:
+            self.assertEqual(dict(self.store.panels(request_id)).keys(), {"panel"})
+
+
+@unittest.skipIf(fakeredis is None, "fakeredis isn't installed")
+@unittest.skipIf(store.redis is None, "redis isn't installed")
+class RedisStoreTestCase(CommonStoreTestsMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.store = store.RedisStore
+
+    def setUp(self) -> None:
+        self.client = fakeredis.FakeRedis(decode_responses=True)
+        patcher = patch.object(
+            store.RedisStore, "_get_client", return_value=self.client
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self) -> None:
+        self.client.flushall()
+
+    def test_data_layout(self):
+        self.store.save_panels("foo", {"panel1": {"a": 1}, "panel2": "b"})
+        self.assertEqual(self.client.zrange("djdt:request_ids", 0, -1), ["foo"])
+        self.assertEqual(
+            self.client.hgetall("djdt:req:foo"),
+            {"panel1": store.serialize({"a": 1}), "panel2": store.serialize("b")},
+        )
+        self.assertGreater(self.client.ttl("djdt:req:foo"), 0)
+        self.assertGreater(self.client.ttl("djdt:request_ids"), 0)
+
+    def test_save_panel_keeps_other_panels(self):
+        self.store.save_panel("foo", "panel1", {"a": 1})
+        self.store.save_panel("foo", "panel2", {"b": 2})
+        self.assertEqual(
+            dict(self.store.panels("foo")), {"panel1": {"a": 1}, "panel2": {"b": 2}}
+        )
+
+    def test_expired_request_ids(self):
+        self.store.set("foo")
+        self.client.zadd("djdt:request_ids", {"foo": 0})
+        self.assertFalse(self.store.exists("foo"))
+        self.assertEqual(list(self.store.request_ids()), [])
+
+        self.store.set("bar")
+        self.assertEqual(self.client.zrange("djdt:request_ids", 0, -1), ["bar"])
+
+    def test_no_ttl(self):
+        config = {**dt_settings.get_config(), "REDIS_TTL": None}
+        with self.settings(DEBUG_TOOLBAR_CONFIG=config):
+            self.store.save_panel("foo", "panel", "value")
+            self.assertTrue(self.store.exists("foo"))
+        self.assertEqual(self.client.ttl("djdt:req:foo"), -1)
+
+    def test_set_evicts_oldest(self):
+        with self.settings(DEBUG_TOOLBAR_CONFIG={"RESULTS_CACHE_SIZE": 2}):
+            for request_id in ("foo", "bar", "baz"):
+                self.store.save_panel(request_id, "panel", "value")
+        self.assertEqual(list(self.store.request_ids()), ["bar", "baz"])
+        self.assertFalse(self.client.exists("djdt:req:foo"))
+
+
+class RedisStoreWithoutRedisTestCase(TestCase):
+    @patch.object(store, "redis", None)
+    def test_redis_not_installed(self):
+        with self.assertRaises(ImproperlyConfigured):
+            store.RedisStore._get_client()
+
 
 class StubStore(store.BaseStore):
     pass
@@ -196,6 +606,7 @@ class DatabaseStoreTestCase(CommonStoreTestsMixin, TestCase):
     def setUp(self) -> None:
         # Cache UUIDs so the same name returns the same UUID within a test
         self._uuid_cache = {}
+        store.DatabaseStore._created_since_cleanup = 0
 
     def tearDown(self) -> None:
         self.store.clear()
@@ -211,7 +622,12 @@ class DatabaseStoreTestCase(CommonStoreTestsMixin, TestCase):
         DatabaseStore test for max size using set() instead of save_panel().
         The cleanup logic is triggered by set(), not save_panel().
         """
-        with self.settings(DEBUG_TOOLBAR_CONFIG={"RESULTS_CACHE_SIZE": 1}):
+        with self.settings(
+            DEBUG_TOOLBAR_CONFIG={
+                "RESULTS_CACHE_SIZE": 1,
+                "RESULTS_CACHE_CLEANUP_INTERVAL": 1,
+            }
+        ):
             # Clear any existing entries first
             self.store.clear()
 
@@ -254,6 +670,39 @@ class DatabaseStoreTestCase(CommonStoreTestsMixin, TestCase):
             # Check that only the most recent 2 entries remain
             self.assertEqual(len(list(self.store.request_ids())), 2)
 
+    def test_cleanup_old_entries_without_cache_size(self):
+        self.store.set(str(uuid.uuid4()))
+        with self.settings(DEBUG_TOOLBAR_CONFIG={"RESULTS_CACHE_SIZE": 0}):
+            self.assertEqual(self.store._cleanup_old_entries(), 0)
+        self.assertEqual(HistoryEntry.objects.count(), 1)
+
+    def test_cleanup_interval(self):
+        config = {"RESULTS_CACHE_SIZE": 1, "RESULTS_CACHE_CLEANUP_INTERVAL": 3}
+        with self.settings(DEBUG_TOOLBAR_CONFIG=config):
+            ids = [str(uuid.uuid4()) for _ in range(4)]
+            for id in ids[:2]:
+                self.store.set(id)
+            # The cleanup hasn't run yet, but request_ids() is still limited.
+            self.assertEqual(HistoryEntry.objects.count(), 2)
+            self.assertEqual(len(self.store.request_ids()), 1)
+
+            # The third new entry triggers the cleanup, re-setting an
+            # existing entry doesn't count towards the interval.
+            self.store.set(ids[0])
+            self.store.set(ids[2])
+            self.assertEqual(HistoryEntry.objects.count(), 1)
+            self.store.set(ids[3])
+            self.assertEqual(HistoryEntry.objects.count(), 2)
+
+    def test_cleanup_disabled(self):
+        config = {"RESULTS_CACHE_SIZE": 1, "RESULTS_CACHE_CLEANUP_INTERVAL": None}
+        with self.settings(DEBUG_TOOLBAR_CONFIG=config):
+            for _ in range(3):
+                self.store.set(str(uuid.uuid4()))
+            self.assertEqual(HistoryEntry.objects.count(), 3)
+            self.assertEqual(self.store._cleanup_old_entries(), 2)
+            self.assertEqual(HistoryEntry.objects.count(), 1)
+
     def test_database_queries_are_efficient(self):
         """Verify that DatabaseStore uses efficient database queries."""
         id1 = str(uuid.uuid4())
@@ -275,6 +724,25 @@ class DatabaseStoreTestCase(CommonStoreTestsMixin, TestCase):
             self.store.exists(id1)
         self.assertEqual(len(context.captured_queries), 1)
 
+    def test_save_panel_is_a_single_query(self):
+        id1 = str(uuid.uuid4())
+        with CaptureQueriesContext(connection) as context:
+            self.store.save_panel(id1, "panel1", {"a": 1})
+            self.store.save_panels(id1, {"panel1": {"a": 2}, "panel2": {"b": 3}})
+        self.assertEqual(len(context.captured_queries), 2)
+        self.assertEqual(
+            dict(self.store.panels(id1)), {"panel1": {"a": 2}, "panel2": {"b": 3}}
+        )
+
+    def test_save_panel_falls_back_to_orm(self):
+        id1 = str(uuid.uuid4())
+        with patch.object(connection, "vendor", "unsupported"):
+            self.store.save_panel(id1, "panel1", {"a": 1})
+            self.store.save_panels(id1, {"panel2": {"b": 2}})
+        self.assertEqual(
+            dict(self.store.panels(id1)), {"panel1": {"a": 1}, "panel2": {"b": 2}}
+        )
+
 
 @override_settings(
     DEBUG_TOOLBAR_CONFIG={
@@ -284,7 +752,9 @@ class DatabaseStoreTestCase(CommonStoreTestsMixin, TestCase):
         "TOOLBAR_STORE_CLASS": "debug_toolbar.store.CacheStore",
     }
 )
-class CacheStoreWithMemoryBackendTestCase(CommonStoreTestsMixin, TestCase):
+class CacheStoreWithMemoryBackendTestCase(
+    CommonStoreTestsMixin, MaxBytesStoreTestsMixin, TestCase
+):
     """
     Test CacheStore with LocMemCache backend (in-memory caching).
     """
@@ -315,9 +785,80 @@ class CacheStoreWithMemoryBackendTestCase(CommonStoreTestsMixin, TestCase):
         ):
             # Verify the key prefix is used
             self.assertEqual(self.store._key_prefix(), "custom:")
-            self.assertEqual(self.store._request_ids_key(), "custom:request_ids")
+            self.assertEqual(self.store._counter_key(), "custom:request_counter")
+            self.assertEqual(self.store._slot_key(1), "custom:slot:1")
             self.assertEqual(self.store._request_key("test"), "custom:req:test")
 
+    def test_concurrent_set(self):
+        def save(thread_index):
+            for i in range(10):
+                self.store.save_panel(f"{thread_index}-{i}", "panel", {"i": i})
+
+        config = {**dt_settings.get_config(), "RESULTS_CACHE_SIZE": 100}
+        with self.settings(DEBUG_TOOLBAR_CONFIG=config):
+            threads = [threading.Thread(target=save, args=(n,)) for n in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            request_ids = self.store.request_ids()
+
+        self.assertEqual(len(request_ids), 80)
+        self.assertEqual(len(set(request_ids)), 80)
+
+    def test_evicted_slots_are_deleted(self):
+        config = {**dt_settings.get_config(), "RESULTS_CACHE_SIZE": 2}
+        with self.settings(DEBUG_TOOLBAR_CONFIG=config):
+            for request_id in ("foo", "bar", "baz", "foo"):
+                self.store.save_panel(request_id, "panel", request_id)
+            self.assertEqual(list(self.store.request_ids()), ["baz", "foo"])
+            cache = self.store._get_cache()
+            self.assertEqual(cache.get(self.store._counter_key()), 4)
+            self.assertEqual(
+                cache.get_many([self.store._slot_key(n) for n in range(1, 5)]),
+                {self.store._slot_key(3): "baz", self.store._slot_key(4): "foo"},
+            )
+            self.assertFalse(cache.has_key(self.store._request_key("bar")))
+
+    def test_set_after_culling(self):
+        self.store.save_panel("foo", "panel", "foo")
+        self.store.save_panel("bar", "panel", "bar")
+        # Simulate the cache backend culling the request's data but not its
+        # slot.
+        self.store._get_cache().delete(self.store._request_key("foo"))
+        self.store.save_panel("foo", "panel", "foo")
+        self.assertEqual(list(self.store.request_ids()), ["foo", "bar"])
+        self.assertEqual(self.store.panel("foo", "panel"), "foo")
+
+    def test_lowered_cache_size(self):
+        config = {**dt_settings.get_config(), "RESULTS_CACHE_SIZE": 30}
+        with self.settings(DEBUG_TOOLBAR_CONFIG=config):
+            for n in range(30):
+                self.store.save_panel(f"req{n}", "panel", n)
+        config["RESULTS_CACHE_SIZE"] = 2
+        with self.settings(DEBUG_TOOLBAR_CONFIG=config):
+            self.store.save_panel("req30", "panel", 30)
+            self.assertEqual(list(self.store.request_ids()), ["req29", "req30"])
+            # The requests left over from the larger size are evicted too.
+            cache = self.store._get_cache()
+            slot_keys = [self.store._slot_key(n) for n in range(1, 32)]
+            self.assertEqual(len(cache.get_many(slot_keys)), 2)
+            self.assertFalse(self.store.exists("req0"))
+            self.assertFalse(self.store.exists("req28"))
+
+    def test_clear_after_lowering_cache_size(self):
+        config = {**dt_settings.get_config(), "RESULTS_CACHE_SIZE": 30}
+        with self.settings(DEBUG_TOOLBAR_CONFIG=config):
+            for n in range(30):
+                self.store.save_panel(f"req{n}", "panel", n)
+        config["RESULTS_CACHE_SIZE"] = 2
+        with self.settings(DEBUG_TOOLBAR_CONFIG=config):
+            self.store.clear()
+        cache = self.store._get_cache()
+        slot_keys = [self.store._slot_key(n) for n in range(1, 31)]
+        self.assertEqual(cache.get_many(slot_keys), {})
+        self.assertFalse(self.store.exists("req0"))
+
     def test_cache_store_operations_not_tracked_by_cache_panel(self):
         """Verify that CacheStore operations don't appear in CachePanel data."""
         # Set up a toolbar with CachePanel
@@ -477,14 +1018,20 @@ class CacheStoreWithDatabaseBackendTestCase(CommonStoreTestsMixin, TestCase):
 
             # Perform various CacheStore operations that will trigger DatabaseCache SQL queries
             self.store.set("test_req")
+            self.store.set("test_req2")
+            initial_query_count = len(sql_panel._queries)
+            self.store.set("test_req3")
 
-            # Verify that no SQL queries to the cache table were recorded
-            # All CacheStore DatabaseCache operations should be invisible to the SQLPanel
+            # Verify that the SQL queries to the cache table were recorded:
+            # add() the request, look for it in the live slots (a get() of the
+            # counter and a get_many() of the slots), incr() the counter (a
+            # get() and a set()) and set() the slot. Each write counts the
+            # entries for the culling.
             cache_queries = [
                 q
                 for q in sql_panel._queries[initial_query_count:]
                 if "test_cache_store_table" in q.get("sql", "").lower()
             ]
-            self.assertEqual(len(cache_queries), 4)
+            self.assertEqual(len(cache_queries), 12)
         finally:
             sql_panel.disable_instrumentation()
@@ -1,7 +1,13 @@
+from unittest.mock import patch
+
 from django.core.exceptions import ImproperlyConfigured
+from django.test.utils import override_settings
 
-from debug_toolbar.toolbar import debug_toolbar_urls
-from tests.base import BaseTestCase
+from debug_toolbar.panels.request import RequestPanel
+from debug_toolbar.panels.sql import SQLPanel
+from debug_toolbar.store import MemoryStore, get_store
+from debug_toolbar.toolbar import DebugToolbar, StoredDebugToolbar, debug_toolbar_urls
+from tests.base import BaseTestCase, IntegrationTestCase
 
 
 class DebugToolbarUrlsTestCase(BaseTestCase):
@@ -15,3 +21,107 @@ class DebugToolbarUrlsTestCase(BaseTestCase):
     def test_has_path(self):
         with self.settings(DEBUG=True):
             self.assertEqual(len(debug_toolbar_urls()), 1)
+
+
+@override_settings(DEBUG=True)
+class StoredDebugToolbarTestCase(IntegrationTestCase):
+    def setUp(self):
+        super().setUp()
+        StoredDebugToolbar.clear_recent()
+        self.client.get("/regular/basic/")
+        self.request_id = list(get_store().request_ids())[-1]
+
+    def test_from_store_loads_stats_lazily(self):
+        with (
+            patch.object(MemoryStore, "panel", wraps=MemoryStore.panel) as panel,
+            patch.object(MemoryStore, "panels", wraps=MemoryStore.panels) as panels,
+        ):
+            toolbar = StoredDebugToolbar.from_store(self.request_id)
+            panel.assert_not_called()
+            panels.assert_not_called()
+
+            stats = toolbar.get_panel_by_id("RequestPanel").get_stats()
+            self.assertEqual(stats["view_func"], "tests.views.regular_view")
+            toolbar.get_panel_by_id("TimerPanel").get_stats()
+            panel.assert_not_called()
+            panels.assert_called_once_with(self.request_id)
+
+    def test_from_store_single_panel(self):
+        with patch.object(MemoryStore, "panels") as panels:
+            toolbar = StoredDebugToolbar.from_store(self.request_id, "RequestPanel")
+            stats = toolbar.get_panel_by_id("RequestPanel").get_stats()
+        self.assertEqual(stats["view_func"], "tests.views.regular_view")
+        self.assertEqual([panel.panel_id for panel in toolbar.panels], ["RequestPanel"])
+        panels.assert_not_called()
+
+    def test_fetch_single_panel(self):
+        with patch.object(DebugToolbar, "get_panel_classes") as get_panel_classes:
+            get_panel_classes.return_value = [RequestPanel, SQLPanel]
+            with patch.object(SQLPanel, "__init__") as init:
+                toolbar = DebugToolbar.fetch(self.request_id, "RequestPanel")
+        init.assert_not_called()
+        self.assertEqual([panel.panel_id for panel in toolbar.panels], ["RequestPanel"])
+        self.assertEqual(toolbar.frame_table.frames, [])
+
+    def test_fetch_reuses_recent_stats(self):
+        toolbar = DebugToolbar.fetch(self.request_id)
+        toolbar.get_panel_by_id("RequestPanel").get_stats()
+        with (
+            patch.object(MemoryStore, "panel") as panel,
+            patch.object(MemoryStore, "panels") as panels,
+        ):
+            fetched = DebugToolbar.fetch(self.request_id, "RequestPanel")
+            stats = fetched.get_panel_by_id("RequestPanel").get_stats()
+        panel.assert_not_called()
+        panels.assert_not_called()
+        self.assertEqual(stats, toolbar.get_panel_by_id("RequestPanel").get_stats())
+        # The fetched toolbars don't share their panels or stats.
+        self.assertIsNot(fetched, toolbar)
+        self.assertIsNot(stats, toolbar.get_panel_by_id("RequestPanel").get_stats())
+
+    def test_save_stats_forgets_recent_stats(self):
+        toolbar = DebugToolbar.fetch(self.request_id, "RequestPanel")
+        toolbar.get_panel_by_id("RequestPanel").record_stats({"view_func": "view"})
+        fetched = DebugToolbar.fetch(self.request_id, "RequestPanel")
+        stats = fetched.get_panel_by_id("RequestPanel").get_stats()
+        self.assertEqual(stats["view_func"], "view")
+
+    def test_recent_stats_are_copied(self):
+        toolbar = DebugToolbar.fetch(self.request_id, "RequestPanel")
+        # Panels may change their stats in place while rendering them.
+        toolbar.get_panel_by_id("RequestPanel").get_stats()["get"]["changed"] = 1
+        fetched = DebugToolbar.fetch(self.request_id, "RequestPanel")
+        stats = fetched.get_panel_by_id("RequestPanel").get_stats()
+        self.assertNotIn("changed", stats["get"])
+        stats["get"]["changed"] = 2
+        fetched = DebugToolbar.fetch(self.request_id, "RequestPanel")
+        stats = fetched.get_panel_by_id("RequestPanel").get_stats()
+        self.assertNotIn("changed", stats["get"])
+
+    def test_flush_stats_forgets_recent_stats(self):
+        toolbar = DebugToolbar.fetch(self.request_id, "RequestPanel")
+        toolbar.buffer_stats = True
+        toolbar.get_panel_by_id("RequestPanel").record_stats({"view_func": "view"})
+        # Fetching the request before the stats are written caches the old
+        # stats again.
+        DebugToolbar.fetch(self.request_id, "RequestPanel").stats  # noqa: B018
+        toolbar.flush_stats()
+        fetched = DebugToolbar.fetch(self.request_id, "RequestPanel")
+        stats = fetched.get_panel_by_id("RequestPanel").get_stats()
+        self.assertEqual(stats["view_func"], "view")
+
+    def test_fetch_evicted_request(self):
+        self.assertIsNotNone(DebugToolbar.fetch(self.request_id))
+        get_store().delete(self.request_id)
+        self.assertIsNone(DebugToolbar.fetch(self.request_id))
+
+    def test_recent_toolbars_are_bounded(self):
+        with patch.object(StoredDebugToolbar, "_recent_size", 2):
+            for _ in range(3):
+                self.client.get("/regular/basic/")
+            for request_id in get_store().request_ids():
+                DebugToolbar.fetch(request_id).stats  # noqa: B018
+            self.assertEqual(
+                list(StoredDebugToolbar._recent),
+                list(get_store().request_ids())[-2:],
+            )
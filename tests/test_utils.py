@@ -1,10 +1,12 @@
 import unittest
+from unittest.mock import patch
 
 from django.http import QueryDict
 from django.test import override_settings
 
 import debug_toolbar.utils
 from debug_toolbar.utils import (
+    FrameTable,
     get_name_from_obj,
     get_stack,
     get_stack_trace,
@@ -66,6 +68,41 @@ class RenderStacktraceTestCase(unittest.TestCase):
         )
 
 
+class FrameTableTestCase(unittest.TestCase):
+    def test_add(self):
+        frame_table = FrameTable()
+        view = ("/server/views.py", 10, "view", "get_users()", None)
+        loop = ("/server/users.py", 20, "get_users", "user.profile", None)
+        other = ("/server/users.py", 21, "get_users", "user.groups", None)
+
+        self.assertEqual(frame_table.add([view, loop]), [0, 1])
+        self.assertEqual(frame_table.add([view, loop]), [0, 1])
+        self.assertEqual(frame_table.add([view, other]), [0, 2])
+        self.assertEqual(frame_table.frames, [view, loop, other])
+        self.assertEqual(frame_table.get([0, 2]), [view, other])
+
+    def test_extract(self):
+        frame_table = FrameTable()
+        view = ("/server/views.py", 10, "view", "get_users()", None)
+        loop = ("/server/users.py", 20, "get_users", "user.profile", None)
+        other = ("/server/users.py", 21, "get_users", "user.groups", None)
+        traces = [frame_table.add([view, other]), frame_table.add([view, loop])]
+
+        frames, traces = frame_table.extract(traces[1:])
+        self.assertEqual(frames, [view, loop])
+        self.assertEqual(traces, [[0, 1]])
+
+    def test_render(self):
+        trace = [
+            ("/server/views.py", 10, "view", "get_users()", None),
+            ("/server/users.py", 20, "get_users", "user.profile", None),
+        ]
+        # Stored frames are lists.
+        frame_table = FrameTable([list(frame) for frame in trace])
+        self.assertEqual(frame_table.render([0, 1]), render_stacktrace(trace))
+        self.assertEqual(frame_table.add(trace), [0, 1])
+
+
 class StackTraceTestCase(unittest.TestCase):
     @override_settings(DEBUG_TOOLBAR_CONFIG={"HIDE_IN_STACKTRACES": []})
     def test_get_stack_trace_skip(self):
@@ -81,6 +118,47 @@ class StackTraceTestCase(unittest.TestCase):
         self.assertEqual(stack_trace[-1][0], __file__)
         self.assertEqual(stack_trace[-1][2], "test_get_stack_trace_skip")
 
+    @override_settings(DEBUG_TOOLBAR_CONFIG={"HIDE_IN_STACKTRACES": []})
+    def test_get_stack_trace_caches_frames(self):
+        def capture():
+            return get_stack_trace()
+
+        stack_traces = []
+        with patch(
+            "debug_toolbar.utils.linecache.getline",
+            wraps=debug_toolbar.utils.linecache.getline,
+        ) as getline:
+            for _request in range(2):
+                getline.reset_mock()
+                stack_traces.append(capture())
+                debug_toolbar.utils.clear_stack_trace_caches()
+        # The frames are resolved once per process, not once per request.
+        getline.assert_not_called()
+        stack_trace = stack_traces[0]
+        self.assertEqual(stack_traces[1], stack_trace)
+        self.assertEqual(stack_trace[-1][2], "capture")
+        self.assertEqual(stack_trace[-1][3], "return get_stack_trace()")
+
+        # The hidden frames depend on the setting.
+        with override_settings(DEBUG_TOOLBAR_CONFIG={"HIDE_IN_STACKTRACES": ["tests"]}):
+            self.assertNotIn(stack_trace[-1], capture())
+
+    @override_settings(
+        DEBUG_TOOLBAR_CONFIG={"HIDE_IN_STACKTRACES": [], "LAZY_STACKTRACES": True}
+    )
+    def test_lazy_stack_trace(self):
+        with patch(
+            "debug_toolbar.utils.linecache.getline",
+            wraps=debug_toolbar.utils.linecache.getline,
+        ) as getline:
+            stack_trace = get_stack_trace()
+        getline.assert_not_called()
+        self.assertEqual(stack_trace[-1][2], "test_lazy_stack_trace")
+        self.assertIsNone(stack_trace[-1][3])
+
+        rendered = render_stacktrace(stack_trace)
+        self.assertIn("stack_trace = get_stack_trace()", rendered)
+
     def test_deprecated_functions(self):
         with self.assertWarns(DeprecationWarning):
             stack = get_stack()